@@ -0,0 +1,22 @@
+# AvecPlaisirShop/runner.py
+"""
+Тестовый раннер проекта (settings.TEST_RUNNER).
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class StrictBudgetTestRunner(DiscoverRunner):
+    """
+    DiscoverRunner со строгими бюджетами SQL-запросов: превышение
+    QUERY_BUDGETS в тестах падает с QueryBudgetExceeded, а не пишется в лог.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._strict_budgets = override_settings(QUERY_BUDGET_STRICT=True)
+        self._strict_budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._strict_budgets.disable()
+        super().teardown_test_environment(**kwargs)
@@ -27,11 +27,16 @@ INSTALLED_APPS = [
 # Middleware
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Server-Timing, лог метрик и бюджет SQL-запросов (QUERY_BUDGETS)
+    'app.middleware.QueryBudgetMiddleware',
+    # Готовые страницы для анонимных посетителей (до сессий и CSRF)
+    'app.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'app.middleware.ReadReplicaMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -41,7 +46,8 @@ ROOT_URLCONF = 'AvecPlaisirShop.urls'
 # Templates
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга (app/profiling.py)
+        'BACKEND': 'app.profiling.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -51,6 +57,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',  # ← ДОБАВЬТЕ ЭТО
+                'app.context_processors.cart',  # счетчик товаров в корзине
             ],
         },
     },
@@ -60,13 +67,45 @@ TEMPLATES = [
 WSGI_APPLICATION = 'AvecPlaisirShop.wsgi.application'
 
 # Database
+# AvecPlaisirShop.sqlite_backend - sqlite3 с WAL и настройками PRAGMA при
+# подключении. Соединения живут DB_CONN_MAX_AGE секунд (0 - новое на каждый
+# запрос) и проверяются перед повторным использованием.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'AvecPlaisirShop.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Транзакции сразу берут блокировку записи: в WAL отложенная
+            # транзакция, начавшая с чтения, не может дождаться записи
+            # и падает с "database is locked" без учета busy_timeout
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64000)),
+                'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024)),
+            },
+        },
     }
 }
 
+# Реплика для чтения (app/routers.py): DB_REPLICA_PATH - путь к копии базы,
+# которую обновляет manage.py sync_replica. Без переменной все идет в default.
+DB_REPLICA_PATH = os.environ.get('DB_REPLICA_PATH')
+REPLICA_DATABASE = 'replica' if DB_REPLICA_PATH else None
+if DB_REPLICA_PATH:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_PATH,
+        # Без transaction_mode: BEGIN IMMEDIATE брал бы блокировку записи на
+        # реплике и мешал sync_replica, а писать в нее некому
+        'OPTIONS': {'pragmas': DATABASES['default']['OPTIONS']['pragmas']},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['app.routers.ReplicaRouter']
+# Страницы (имена URL), которые читают с реплики
+REPLICA_READ_VIEWS = ('catalog', 'blog_list', 'blog_article_detail', 'feedback_list')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -99,5 +138,129 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'app' / 'media'
 
+# Cache
+# 'fragments' хранит отрендеренные карточки товаров и тексты статей, 'pages' -
+# целые страницы для анонимных посетителей (app/caching.py).
+# Ключи фрагментов содержат версию объекта, поэтому им достаточно locmem;
+# FRAGMENT_CACHE_BACKEND=file делает их общими для процессов. Страница в locmem
+# осталась бы в остальных воркерах после изменения данных, поэтому 'pages' по
+# умолчанию файловый; с PAGE_CACHE_BACKEND=locmem AnonymousPageCacheMiddleware
+# отключается.
+FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'locmem')
+FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR', str(BASE_DIR / 'cache' / 'fragments'))
+# Увеличить при изменении разметки внутри {% cache_object %}
+FRAGMENT_CACHE_VERSION = 2
+PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'file')
+PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR', str(BASE_DIR / 'cache' / 'pages'))
+# 'shared' - всегда файловый, общий для всех процессов кэш небольших значений,
+# которые сбрасываются при изменениях: счетчики поколений тем (их видят все
+# воркеры независимо от PAGE_CACHE_BACKEND), счетчик корзины в
+# app/context_processors.py, список категорий каталога в app/caching.py
+SHARED_CACHE_DIR = os.environ.get('SHARED_CACHE_DIR', str(BASE_DIR / 'cache' / 'shared'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'avec-plaisir-default',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'avec-plaisir-fragments',
+        'TIMEOUT': 60 * 60 * 24,
+        'VERSION': FRAGMENT_CACHE_VERSION,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'avec-plaisir-pages',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+if FRAGMENT_CACHE_BACKEND == 'file':
+    CACHES['fragments'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': FRAGMENT_CACHE_DIR,
+        'TIMEOUT': 60 * 60 * 24,
+        'VERSION': FRAGMENT_CACHE_VERSION,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+if PAGE_CACHE_BACKEND == 'file':
+    CACHES['pages'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': PAGE_CACHE_DIR,
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+
+# Страницы, которые кэшируются целиком для анонимных посетителей: имя URL ->
+# темы данных (см. app/caching.PAGE_TOPICS), изменение которых сбрасывает страницу
+ANONYMOUS_PAGE_CACHE_VIEWS = {
+    'home': (),
+    'about': (),
+    'contact': (),
+    'video_page': (),
+    'catalog': ('products',),
+    'blog_list': ('articles', 'comments'),
+}
+
+# Бюджеты SQL-запросов на один HTTP-запрос по имени URL (app/profiling.py),
+# с учетом сессии, пользователя, холодного кэша счетчика корзины и SAVEPOINT;
+# для форм бюджет рассчитан на POST (сохранение, удаление со связанными строками).
+# При превышении - предупреждение в логе, в строгом режиме (manage.py test
+# или QUERY_BUDGET_STRICT=1) - исключение QueryBudgetExceeded. Бюджет нужен
+# каждой странице: это проверяет app.tests.QueryCountTest.
+QUERY_BUDGETS = {
+    'home': 4,
+    'about': 4,
+    'contact': 4,
+    'video_page': 4,
+    'feedback': 8,
+    'feedback_list': 5,
+    'my_feedbacks': 4,
+    'blog_list': 6,
+    'blog_article_detail': 8,
+    'blog_article_comments': 5,
+    'search': 5,
+    'catalog': 6,
+    'catalog_autocomplete': 3,
+    'api_products': 3,
+    'view_cart': 12,
+    'add_to_cart': 12,
+    'update_cart_item': 10,
+    'remove_from_cart': 10,
+    'clear_cart': 10,
+    'register': 10,
+    'login': 10,
+    'logout': 5,
+    'export_feedback': 4,
+    'delete_feedback': 10,
+    'create_article': 10,
+    'edit_article': 10,
+    'delete_article': 10,
+    'delete_comment': 10,
+    'create_product': 10,
+    'edit_product': 10,
+    'delete_product': 10,
+    # Списки объектов в админках
+    'admin:auth_group_changelist': 7,
+    'admin:auth_user_changelist': 7,
+    'admin:app_feedback_changelist': 8,
+    'admin:app_userprofile_changelist': 6,
+    'admin:app_souvenir_changelist': 6,
+    'admin:app_blogarticle_changelist': 6,
+    'admin:app_task_changelist': 7,
+    'blogadmin:app_blogarticle_changelist': 9,
+    'blogadmin:app_comment_changelist': 7,
+}
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+# Включает QUERY_BUDGET_STRICT на время manage.py test
+TEST_RUNNER = 'AvecPlaisirShop.runner.StrictBudgetTestRunner'
+
 # Default primary key
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
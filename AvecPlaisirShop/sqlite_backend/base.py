@@ -0,0 +1,53 @@
+# AvecPlaisirShop/sqlite_backend/base.py
+"""
+Бэкенд SQLite с настройками для работы под несколькими воркерами.
+
+Стандартный django.db.backends.sqlite3 открывает базу в режиме rollback
+journal: пока идет запись (добавление в корзину), читатели ждут. Здесь при
+каждом новом соединении выполняются PRAGMA:
+
+- journal_mode=WAL - читатели не блокируются писателем и наоборот;
+- synchronous=NORMAL - fsync только при checkpoint (в WAL это безопасно
+  для целостности, теряются лишь последние транзакции при сбое питания);
+- cache_size / mmap_size - кэш страниц соединения и чтение через mmap;
+- busy_timeout - ожидание блокировки вместо немедленного "database is locked".
+
+Значения по умолчанию из DEFAULT_PRAGMAS можно переопределить в
+DATABASES[...]['OPTIONS']['pragmas'] (None отключает PRAGMA).
+Соединения держатся между запросами через CONN_MAX_AGE, поэтому PRAGMA
+выполняются один раз на соединение, а не на каждый запрос.
+
+journal_mode=WAL сохраняется в заголовке файла базы: db.sqlite3 из репозитория
+меняется при первом подключении, рядом появляются db.sqlite3-wal и
+db.sqlite3-shm (они в .gitignore). Изменение db.sqlite3 коммитить не нужно.
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Отрицательное значение - размер в КиБ (64 МиБ на соединение)
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+# Не применяются к базе в памяти (тестовая база)
+FILE_ONLY_PRAGMAS = ('journal_mode', 'mmap_size')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        pragmas = {**DEFAULT_PRAGMAS, **params.pop('pragmas', {})}
+        self.pragmas = {name: value for name, value in pragmas.items() if value is not None}
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        in_memory = self.is_in_memory_db()
+        for name, value in self.pragmas.items():
+            if in_memory and name in FILE_ONLY_PRAGMAS:
+                continue
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
@@ -3,13 +3,14 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
+from app.api import api_products
 from app.views import (
     home, about, contact, feedback, feedback_list,
     register, user_login, user_logout, my_feedbacks,
-    delete_feedback, blog_list, blog_article_detail,
+    delete_feedback, export_feedback, blog_list, blog_article_detail, blog_article_comments,
     create_article, edit_article, delete_article, delete_comment,
-    video_page,
-    catalog, create_product, edit_product, delete_product,
+    video_page, search,
+    catalog, catalog_autocomplete, create_product, edit_product, delete_product,
     view_cart, add_to_cart, remove_from_cart, update_cart_item, clear_cart
 )
 
@@ -37,9 +38,11 @@ urlpatterns += [
     path('feedback/', feedback, name='feedback'),  
     path('feedback/all/', feedback_list, name='feedback_list'),
     path('feedback/delete/<int:feedback_id>/', delete_feedback, name='delete_feedback'),
+    path('feedback/export/', export_feedback, name='export_feedback'),
     path('my-feedbacks/', my_feedbacks, name='my_feedbacks'),
     path('blog/', blog_list, name='blog_list'),
     path('blog/article/<int:article_id>/', blog_article_detail, name='blog_article_detail'),
+    path('blog/article/<int:article_id>/comments/', blog_article_comments, name='blog_article_comments'),
     path('blog/edit/<int:article_id>/', edit_article, name='edit_article'),
     path('blog/create/', create_article, name='create_article'),
     path('blog/delete/<int:article_id>/', delete_article, name='delete_article'),
@@ -49,7 +52,10 @@ urlpatterns += [
     path('blog/comment/delete/<int:comment_id>/', delete_comment, name='delete_comment'),
     # Страница с видео
     path('video/', video_page, name='video_page'),
+    path('search/', search, name='search'),
     path('catalog/', catalog, name='catalog'),
+    path('catalog/autocomplete/', catalog_autocomplete, name='catalog_autocomplete'),
+    path('api/products/', api_products, name='api_products'),
     path('catalog/add/', create_product, name='create_product'),  # для админов
     path('catalog/edit/<int:product_id>/', edit_product, name='edit_product'),
     path('catalog/delete/<int:product_id>/', delete_product, name='delete_product'),
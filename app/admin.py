@@ -7,7 +7,8 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.contrib import messages
 from django.http import HttpResponseRedirect
-from .models import Feedback, Souvenir, UserProfile, BlogArticle
+from .models import Feedback, Souvenir, UserProfile, BlogArticle, Task
+from .search import FullTextSearchAdminMixin
 from django.db import connection
 
 
@@ -17,6 +18,13 @@ class FeedbackAdmin(admin.ModelAdmin):
     list_filter = ['overall_rating', 'visit_frequency', 'created_at']
     search_fields = ['name', 'email', 'suggestions']
     readonly_fields = ['created_at']
+    raw_id_fields = ['user']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change or 'liked_features' in form.changed_data:
+            # Держим таблицу FeedbackFeature в соответствии с текстовым полем
+            obj.set_liked_features(obj.parse_liked_features(obj.liked_features))
     
     def response_change(self, request, obj):
         if "_delete_feedback" in request.POST:
@@ -51,18 +59,36 @@ class SouvenirAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
 
 
-class MainBlogArticleAdmin(admin.ModelAdmin):
+class MainBlogArticleAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     """Упрощенная версия для основной админки (опционально)"""
+    search_index = 'article'
     list_display = ['title', 'published_date', 'created_at']
     list_filter = ['published_date']
     search_fields = ['title']
 
 
+class TaskAdmin(admin.ModelAdmin):
+    """Очередь фоновых задач (выполняет manage.py run_worker)"""
+    list_display = ['id', 'name', 'status', 'attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'key']
+    readonly_fields = ['locked_at', 'created_at', 'finished_at', 'last_error']
+    actions = ['retry_tasks']
+    
+    def retry_tasks(self, request, queryset):
+        count = queryset.exclude(status=Task.RUNNING).update(
+            status=Task.PENDING, attempts=0, run_after=timezone.now(), locked_at=None,
+        )
+        self.message_user(request, f'Поставлено в очередь повторно: {count}.', messages.SUCCESS)
+    retry_tasks.short_description = "Повторить выбранные задачи"
+
+
 # Регистрируем модели в основной админке
 admin.site.register(Feedback, FeedbackAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
 admin.site.register(Souvenir, SouvenirAdmin)
 admin.site.register(BlogArticle, MainBlogArticleAdmin)  # Упрощенная версия
+admin.site.register(Task, TaskAdmin)
 
 # Перерегистрируем User
 admin.site.unregister(User)
@@ -0,0 +1,132 @@
+# app/api.py
+"""
+Read-only JSON API каталога для мобильного клиента.
+
+GET /api/products/?fields=id,name,price&category=сувенир&limit=50&after=<курсор>
+
+Строки выбираются через .values() только по запрошенным столбцам (плюс
+ключ сортировки name, id), без создания объектов моделей, и сериализуются
+в потоковый ответ по одному товару. Пагинация курсорная (app/pagination.py),
+ETag строится по поколению темы products (app/caching.py), без агрегата по
+всей таблице перед запросом страницы.
+"""
+import json
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_safe
+
+from .caching import get_generations
+from .models import Product
+from .pagination import keyset_paginate
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+API_ORDERING = ('name', 'id')
+
+# Поля, доступные в ?fields=, и преобразование значения для JSON
+PRODUCT_API_FIELDS = {
+    'id': None,
+    'name': None,
+    'description': None,
+    'price': str,
+    'category': None,
+    'image': lambda name: default_storage.url(name) if name else None,
+    'created_at': None,
+    'updated_at': None,
+}
+PRODUCT_API_DEFAULT_FIELDS = ('id', 'name', 'price', 'category', 'image')
+
+
+class ApiError(ValueError):
+    pass
+
+
+def _positive_int(value, default, maximum):
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ApiError('limit должен быть целым числом')
+    return max(1, min(number, maximum))
+
+
+def parse_fields(value):
+    """Список полей из ?fields= (порядок запроса, без повторов)"""
+    if not value:
+        return list(PRODUCT_API_DEFAULT_FIELDS)
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in PRODUCT_API_FIELDS:
+            raise ApiError(f'Неизвестное поле: {name}')
+        fields.append(name)
+    if not fields:
+        raise ApiError('Не указано ни одного поля')
+    return fields
+
+
+def _products_etag(request):
+    return 'products-' + '.'.join(map(str, get_generations(('products',))))
+
+
+def _page_url(request, **params):
+    query = request.GET.copy()
+    for key in ('after', 'before'):
+        query.pop(key, None)
+    query.update(params)
+    return f'{request.path}?{query.urlencode()}'
+
+
+def _iter_products_json(request, page, fields):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    converters = [(name, PRODUCT_API_FIELDS[name]) for name in fields]
+    yield '{"results":['
+    separator = ''
+    for row in page:
+        item = {
+            name: convert(row[name]) if convert is not None and row[name] is not None else row[name]
+            for name, convert in converters
+        }
+        yield separator + encoder.encode(item)
+        separator = ','
+    next_url = _page_url(request, after=page.next_cursor) if page.next_cursor else None
+    previous_url = _page_url(request, before=page.previous_cursor) if page.previous_cursor else None
+    yield '],"next":' + json.dumps(next_url) + ',"previous":' + json.dumps(previous_url) + '}'
+
+
+@require_safe
+@condition(etag_func=_products_etag)
+def api_products(request):
+    """Список товаров: ?fields=, ?category= (можно несколько), ?limit=, ?after= / ?before="""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        limit = _positive_int(request.GET.get('limit'), API_PAGE_SIZE, API_MAX_PAGE_SIZE)
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    products = Product.objects.all()
+    categories = [category for category in request.GET.getlist('category') if category]
+    if len(categories) == 1:
+        products = products.filter(category=categories[0])
+    elif categories:
+        products = products.filter(category__in=categories)
+
+    columns = list(dict.fromkeys([*fields, *API_ORDERING]))
+    page = keyset_paginate(
+        products.values(*columns),
+        API_ORDERING,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=limit,
+    )
+    response = StreamingHttpResponse(
+        _iter_products_json(request, page, fields),
+        content_type='application/json; charset=utf-8',
+    )
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class MainAppConfig(AppConfig):
+    name = 'app'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        # Обработчики сигналов, которые живут вне models.py
+        from . import autocomplete, caching, images, search  # noqa: F401
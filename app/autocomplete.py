@@ -0,0 +1,177 @@
+# app/autocomplete.py
+"""
+Автодополнение названий товаров без обращения к БД на каждое нажатие.
+
+Индекс живет в памяти процесса: отсортированные массивы нормализованных
+ключей (полное название и каждое слово названия), поиск по префиксу -
+двоичный поиск bisect. Индекс загружается лениво при первом запросе,
+обновляется сигналами post_save/post_delete в этом процессе и
+перезагружается целиком раз в AUTOCOMPLETE_INDEX_MAX_AGE секунд, чтобы
+подхватить изменения, сделанные другими процессами. Перезагрузку выполняет
+один запрос, остальные потоки в это время ищут по прежнему индексу.
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product
+
+_SEPARATOR_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """
+    Привести строку к виду для сравнения: нижний регистр, без диакритики
+    (ё -> е, é -> e), знаки препинания заменены пробелами.
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _SEPARATOR_RE.sub(' ', stripped.casefold()).strip()
+
+
+class ProductPrefixIndex:
+    """Префиксный индекс по Product.name"""
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        # Держит поток, который загружает индекс (load() под ним не выполняется дважды)
+        self._load_lock = threading.Lock()
+        self._names = []     # отсортированные (нормализованное название, id)
+        self._words = []     # отсортированные (слово названия, id)
+        self._products = {}  # id -> (name, price, category)
+        self._loaded_at = None
+
+    def _max_age(self):
+        if self.max_age is not None:
+            return self.max_age
+        return getattr(settings, 'AUTOCOMPLETE_INDEX_MAX_AGE', 300)
+
+    @staticmethod
+    def _keys(product_id, name):
+        normalized = normalize(name)
+        words = {word for word in normalized.split(' ')[1:] if word}
+        return (normalized, product_id), [(word, product_id) for word in words]
+
+    def load(self):
+        """Построить индекс заново по таблице товаров"""
+        names, words, products = [], [], {}
+        rows = Product.objects.values_list('id', 'name', 'price', 'category')
+        for product_id, name, price, category in rows.iterator(chunk_size=5000):
+            name_key, word_keys = self._keys(product_id, name)
+            names.append(name_key)
+            words.extend(word_keys)
+            products[product_id] = (name, price, category)
+        names.sort()
+        words.sort()
+        with self._lock:
+            self._names, self._words, self._products = names, words, products
+            self._loaded_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._names, self._words, self._products = [], [], {}
+            self._loaded_at = None
+
+    @property
+    def is_loaded(self):
+        return self._loaded_at is not None
+
+    def _needs_load(self):
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self._max_age()
+
+    def _ensure_loaded(self):
+        """
+        Первая загрузка: все потоки ждут одну загрузку. Устаревший индекс
+        перезагружает поток, первым взявший блокировку; остальные не ждут.
+        """
+        if not self._needs_load():
+            return
+        if not self._load_lock.acquire(blocking=not self.is_loaded):
+            return
+        try:
+            # Пока ждали блокировку, индекс мог загрузить другой поток
+            if self._needs_load():
+                self.load()
+        finally:
+            self._load_lock.release()
+
+    def _remove_keys(self, product_id):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        name_key, word_keys = self._keys(product_id, product[0])
+        for keys, key in [(self._names, name_key)] + [(self._words, key) for key in word_keys]:
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+
+    def update(self, product_id, name, price, category):
+        """Добавить или обновить товар (если индекс уже загружен)"""
+        with self._lock:
+            if not self.is_loaded:
+                return
+            self._remove_keys(product_id)
+            name_key, word_keys = self._keys(product_id, name)
+            insort(self._names, name_key)
+            for key in word_keys:
+                insort(self._words, key)
+            self._products[product_id] = (name, price, category)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove_keys(product_id)
+
+    @staticmethod
+    def _scan(keys, prefix, limit, found):
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and len(found) < limit:
+            key, product_id = keys[position]
+            if not key.startswith(prefix):
+                break
+            if product_id not in found:
+                found.append(product_id)
+            position += 1
+
+    def lookup(self, query, limit=8):
+        """
+        До limit товаров, чье название (или любое слово названия) начинается
+        с query. Сначала совпадения с начала названия, затем по словам.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            found = []
+            self._scan(self._names, prefix, limit, found)
+            if len(found) < limit:
+                self._scan(self._words, prefix, limit, found)
+            return [(product_id,) + self._products[product_id] for product_id in found]
+
+
+product_index = ProductPrefixIndex()
+
+
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, raw=False, **kwargs):
+    """Обновить товар в индексе автодополнения этого процесса после коммита"""
+    if raw:
+        return
+    values = (instance.pk, instance.name, instance.price, instance.category)
+    transaction.on_commit(lambda: product_index.update(*values))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    """Удалить товар из индекса автодополнения этого процесса после коммита"""
+    product_id = instance.pk
+    transaction.on_commit(lambda: product_index.remove(product_id))
@@ -4,10 +4,13 @@ from django.urls import reverse
 from django.utils.html import format_html
 from django.utils import timezone
 from django.contrib import messages
+from .caching import bump_generation
 from .models import BlogArticle, Comment
+from .search import FullTextSearchAdminMixin
 
-class BlogArticleAdmin(admin.ModelAdmin):
+class BlogArticleAdmin(FullTextSearchAdminMixin, admin.ModelAdmin):
     """Отдельная админ-панель только для статей блога"""
+    search_index = 'article'
     list_display = ['id', 'title', 'short_content_preview', 'published_date', 'created_at', 'view_on_site_link']
     list_display_links = ['id', 'title']
     list_filter = ['published_date', 'created_at']
@@ -45,7 +48,11 @@ class BlogArticleAdmin(admin.ModelAdmin):
     
     # Метод для публикации статей
     def publish_selected_articles(self, request, queryset):
-        count = queryset.update(published_date=timezone.now())
+        # update() не вызывает сигналы и не трогает auto_now: обновляем updated_at
+        # сами (ETag и кэш фрагментов) и сбрасываем кэш страниц
+        now = timezone.now()
+        count = queryset.update(published_date=now, updated_at=now)
+        bump_generation('articles')
         self.message_user(request, f'✅ Опубликовано {count} статей.', messages.SUCCESS)
     publish_selected_articles.short_description = "📅 Опубликовать выбранные статьи"
 
@@ -82,11 +89,13 @@ class CommentAdmin(admin.ModelAdmin):
     # Методы для действий с комментариями
     def approve_comments(self, request, queryset):
         count = queryset.update(approved_comment=True)
+        bump_generation('comments')
         self.message_user(request, f'✅ Одобрено {count} комментариев.', messages.SUCCESS)
     approve_comments.short_description = "✅ Одобрить выбранные комментарии"
     
     def disapprove_comments(self, request, queryset):
         count = queryset.update(approved_comment=False)
+        bump_generation('comments')
         self.message_user(request, f'🚫 Скрыто {count} комментариев.', messages.WARNING)
     disapprove_comments.short_description = "🚫 Скрыть выбранные комментарии"
 
@@ -0,0 +1,185 @@
+# app/caching.py
+"""
+Кэш отрендеренных фрагментов шаблонов по объектам.
+
+Фрагмент (карточка товара, текст статьи) хранится в кэше 'fragments' по
+ключу «модель:id:имя:версия», где версия — updated_at объекта. Изменение
+объекта дает новый ключ, а сигналы post_save/post_delete удаляют запись
+текущей версии (на случай save(update_fields=...) без updated_at и удаления).
+После изменения шаблонов фрагментов увеличьте VERSION в CACHES['fragments'].
+
+В шаблоне: {% load cache_tags %}{% cache_object product "card" %}...{% endcache_object %}
+
+Страницы для анонимных посетителей (AnonymousPageCacheMiddleware) хранятся
+в кэше 'pages'. В ключ страницы входят поколения тем данных, от которых она
+зависит; любое изменение товара, статьи или комментария увеличивает
+поколение своей темы, и старые записи больше не читаются. Счетчики поколений
+лежат в общем для всех процессов кэше 'shared' (даже когда 'pages' - locmem,
+по ним строятся ETag страниц), там же по поколению хранится список категорий.
+"""
+import time
+
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BlogArticle, Comment, Product
+
+FRAGMENT_CACHE_ALIAS = 'fragments'
+PAGE_CACHE_ALIAS = 'pages'
+SHARED_CACHE_ALIAS = 'shared'
+CATEGORIES_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Тема данных, к которой относится модель (для сброса страниц)
+PAGE_TOPICS = {
+    Product: 'products',
+    BlogArticle: 'articles',
+    Comment: 'comments',
+}
+
+# Фрагменты, которые кэшируются для модели (нужны, чтобы удалить их вместе с объектом)
+FRAGMENTS = {
+    Product: ('card',),
+    BlogArticle: ('body',),
+}
+
+# Флаг в render_context: внутри фрагмента выведено что-то временное
+UNCACHEABLE = 'fragment_uncacheable'
+
+
+def fragment_cache():
+    return caches[FRAGMENT_CACHE_ALIAS]
+
+
+def object_version(obj):
+    updated_at = getattr(obj, 'updated_at', None)
+    return f'{updated_at.timestamp():.6f}' if updated_at else '0'
+
+
+def fragment_key(obj, name):
+    return f'fragment:{obj._meta.label_lower}:{obj.pk}:{name}:{object_version(obj)}'
+
+
+def prefetch_fragments(objects, name):
+    """
+    Загрузить фрагменты для списка объектов одним get_many
+    (для файлового кэша это одна серия чтений вместо запроса на каждый тег).
+    """
+    objects = [obj for obj in objects if obj.pk is not None]
+    keys = {fragment_key(obj, name): obj for obj in objects}
+    found = fragment_cache().get_many(keys)
+    for obj in objects:
+        prefetched = obj.__dict__.setdefault('_prefetched_fragments', {})
+        prefetched[name] = found.get(fragment_key(obj, name))
+    return objects
+
+
+def get_fragment(obj, name):
+    prefetched = getattr(obj, '_prefetched_fragments', {})
+    if name in prefetched:
+        return prefetched[name]
+    return fragment_cache().get(fragment_key(obj, name))
+
+
+def set_fragment(obj, name, value):
+    fragment_cache().set(fragment_key(obj, name), value)
+    getattr(obj, '_prefetched_fragments', {}).pop(name, None)
+
+
+def mark_uncacheable(context):
+    """Не сохранять текущий фрагмент (например, изображение еще без вариантов)"""
+    if UNCACHEABLE in context.render_context:
+        context.render_context[UNCACHEABLE] = True
+
+
+def delete_fragments(obj):
+    names = FRAGMENTS.get(type(obj), ())
+    fragment_cache().delete_many([fragment_key(obj, name) for name in names])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=BlogArticle)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=BlogArticle)
+def invalidate_fragments(sender, instance, raw=False, **kwargs):
+    """Удалить закэшированные фрагменты сохраненного или удаленного объекта"""
+    if raw:
+        return
+    delete_fragments(instance)
+
+
+def page_cache():
+    return caches[PAGE_CACHE_ALIAS]
+
+
+def generation_cache():
+    return caches[SHARED_CACHE_ALIAS]
+
+
+def _generation_key(topic):
+    return f'page_generation:{topic}'
+
+
+def get_generations(topics):
+    """
+    Текущие поколения тем. Отсутствующий счетчик (первый запуск или
+    вытеснение из кэша) начинается со времени в наносекундах, чтобы не
+    совпасть с поколением, под которым уже лежат старые страницы.
+    """
+    cache = generation_cache()
+    keys = [_generation_key(topic) for topic in topics]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump_generation(*topics):
+    """Сбросить закэшированные страницы, зависящие от тем"""
+    cache = generation_cache()
+    for topic in topics:
+        key = _generation_key(topic)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def product_categories():
+    """
+    Отсортированный список категорий товаров. Ключ содержит поколение темы
+    products, поэтому сигналы товаров (и bump_generation после импорта)
+    сбрасывают список во всех процессах. При промахе список читается с
+    основной базы: с отстающей реплики он остался бы в кэше до следующего
+    изменения товаров.
+    """
+    generation, = get_generations(('products',))
+    cache = caches[SHARED_CACHE_ALIAS]
+    key = f'product_categories:{generation}'
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(
+            Product.objects.using(DEFAULT_DB_ALIAS)
+            .order_by('category').values_list('category', flat=True).distinct()
+        )
+        cache.set(key, categories, CATEGORIES_CACHE_TIMEOUT)
+    return categories
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=BlogArticle)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=BlogArticle)
+@receiver(post_delete, sender=Comment)
+def invalidate_pages(sender, instance, **kwargs):
+    """
+    Сбросить страницы, которые показывают измененный объект. Сброс после
+    коммита: иначе параллельный запрос успел бы сохранить старые данные
+    уже под новым поколением.
+    """
+    topic = PAGE_TOPICS[sender]
+    transaction.on_commit(lambda: bump_generation(topic))
@@ -0,0 +1,63 @@
+# app/conditional.py
+"""
+Валидаторы для условных GET-запросов (ETag / If-None-Match).
+
+Страницы каталога и блога содержат персональные части (имя пользователя,
+счетчик корзины, кнопки персонала, CSRF-токен в формах), поэтому ETag
+складывается из дешевых признаков данных (максимальный updated_at,
+количество строк, время последнего комментария) и признаков посетителя.
+Last-Modified не отдается: по одной дате нельзя учесть смену пользователя.
+ETag считается только для GET и HEAD (декоратор safe_methods_only), чтобы
+отправка форм не выполняла лишних запросов.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+
+from .context_processors import get_cart_items_count
+
+# Увеличить при изменении шаблонов, чтобы сбросить закэшированные браузерами страницы
+PAGE_ETAG_VERSION = getattr(settings, 'PAGE_ETAG_VERSION', '1')
+
+
+def safe_methods_only(etag_func):
+    """etag_func для @condition, который для POST и других методов возвращает None"""
+    @functools.wraps(etag_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return etag_func(request, *args, **kwargs)
+    return wrapper
+
+
+def has_pending_messages(request):
+    """Есть ли непоказанные flash-сообщения (без пометки их прочитанными)"""
+    return bool(len(get_messages(request)))
+
+
+def visitor_state(request):
+    """Признаки посетителя, от которых зависит разметка страницы"""
+    user = request.user
+    if not user.is_authenticated:
+        return ('anon', request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+    return (
+        user.pk,
+        user.get_username(),
+        user.is_staff,
+        user.is_superuser,
+        get_cart_items_count(user),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+
+
+def page_etag(request, *validators):
+    """
+    ETag страницы из валидаторов данных и состояния посетителя.
+    Возвращает None (ответ без ETag), если на странице будут сообщения.
+    """
+    if has_pending_messages(request):
+        return None
+    parts = (PAGE_ETAG_VERSION, request.get_full_path(), visitor_state(request), validators)
+    return hashlib.md5(repr(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
@@ -0,0 +1,52 @@
+# app/context_processors.py
+"""
+Контекст-процессоры для layout.html.
+
+Счетчик корзины хранится в общем для процессов кэше 'shared' по ключу
+пользователя, поэтому обычные страницы сайта не обращаются к таблицам
+Cart/CartItem. Представления, изменяющие корзину, сбрасывают запись через
+invalidate_cart_items_count(), и сброс виден всем воркерам.
+"""
+from django.core.cache import caches
+
+from .models import CartItem
+
+CART_COUNT_CACHE_ALIAS = 'shared'
+CART_COUNT_CACHE_TIMEOUT = 60 * 15
+
+
+def cart_count_cache():
+    return caches[CART_COUNT_CACHE_ALIAS]
+
+
+def cart_count_cache_key(user):
+    # date_joined отличает нового пользователя, получившего id удаленного
+    return f'cart_items_count:{user.pk}:{user.date_joined.timestamp():.6f}'
+
+
+def get_cart_items_count(user):
+    """Количество позиций в активной корзине пользователя (с кэшированием)"""
+    if not user.is_authenticated:
+        return 0
+    cache = cart_count_cache()
+    key = cart_count_cache_key(user)
+    count = cache.get(key)
+    if count is None:
+        count = CartItem.objects.filter(cart__user=user, cart__is_active=True).count()
+        cache.set(key, count, CART_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def set_cart_items_count(user, count):
+    """Сохранить уже известное количество позиций (например, из итогов корзины)"""
+    cart_count_cache().set(cart_count_cache_key(user), count, CART_COUNT_CACHE_TIMEOUT)
+
+
+def invalidate_cart_items_count(user):
+    """Сбросить закэшированный счетчик после изменения корзины"""
+    cart_count_cache().delete(cart_count_cache_key(user))
+
+
+def cart(request):
+    """Добавляет cart_items_count в контекст всех шаблонов"""
+    return {'cart_items_count': get_cart_items_count(request.user)}
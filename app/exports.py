@@ -0,0 +1,87 @@
+# app/exports.py
+"""
+Потоковая выгрузка отзывов для аналитики (CSV и NDJSON).
+
+Строки читаются через values_list(...).iterator(chunk_size=...), поэтому
+ни queryset, ни экземпляры моделей не накапливаются в памяти: выгрузка
+миллиона отзывов идет с постоянным расходом памяти.
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Feedback
+
+FEEDBACK_EXPORT_FIELDS = [
+    'id', 'created_at', 'name', 'email', 'overall_rating', 'recommendation',
+    'visit_frequency', 'liked_features', 'suggestions', 'agree_to_terms',
+]
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+EXPORT_CHUNK_SIZE = 2000
+# Сколько строк склеивать в один кусок ответа
+ROWS_PER_WRITE = 500
+
+
+def _day_start(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'Неверная дата {name}: "{value}" (ожидается ГГГГ-ММ-ДД)')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def feedback_export_queryset(date_from=None, date_to=None):
+    """
+    Отзывы в порядке создания; date_from и date_to - строки ГГГГ-ММ-ДД,
+    обе границы включительно.
+    """
+    queryset = Feedback.objects.order_by('created_at', 'id')
+    if date_from:
+        queryset = queryset.filter(created_at__gte=_day_start(date_from, 'date_from'))
+    if date_to:
+        queryset = queryset.filter(created_at__lt=_day_start(date_to, 'date_to') + timedelta(days=1))
+    return queryset.values_list(*FEEDBACK_EXPORT_FIELDS)
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= ROWS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def _csv_lines(queryset, chunk_size):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FEEDBACK_EXPORT_FIELDS)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(queryset, chunk_size):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield encoder.encode(dict(zip(FEEDBACK_EXPORT_FIELDS, row))) + '\n'
+
+
+def iter_feedback_export(queryset, export_format='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """Генератор кусков выгрузки в формате csv или ndjson"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: "{export_format}"')
+    lines = _csv_lines if export_format == 'csv' else _ndjson_lines
+    return _batched(lines(queryset, chunk_size))
@@ -1,6 +1,6 @@
 ﻿from django import forms
 from django.core.validators import MinLengthValidator, MaxLengthValidator
-from .models import Comment, BlogArticle, Product, CartItem  # ← ВСЕ МОДЕЛИ ЗДЕСЬ
+from .models import Comment, BlogArticle, Product, CartItem, LIKED_FEATURE_CHOICES  # ← ВСЕ МОДЕЛИ ЗДЕСЬ
 
 class FeedbackForm(forms.Form):
     # Поля ввода
@@ -43,14 +43,7 @@ class FeedbackForm(forms.Form):
     )
     
     # Флажки - что понравилось
-    LIKED_FEATURES = [
-        ('design', 'Дизайн сайта'),
-        ('navigation', 'Удобная навигация'),
-        ('products', 'Ассортимент товаров'),
-        ('prices', 'Цены'),
-        ('delivery', 'Условия доставки'),
-        ('support', 'Работа поддержки'),
-    ]
+    LIKED_FEATURES = LIKED_FEATURE_CHOICES
     
     liked_features = forms.MultipleChoiceField(
         label='Что вам понравилось на сайте? (можно выбрать несколько)',
@@ -0,0 +1,276 @@
+# app/images.py
+"""
+Уменьшенные копии изображений товаров и статей.
+
+Для каждого загруженного файла генерируются варианты WebP и JPEG
+фиксированной ширины в фоновом обработчике (задача images.prepare_variants,
+см. app/tasks.py), поэтому сохранение в админке не ждет Pillow. Варианты
+лежат в MEDIA_ROOT/variants/<хэш содержимого>/, поэтому одинаковые файлы
+обрабатываются один раз, а замена изображения автоматически дает новые
+адреса. Описание вариантов (манифест) кэшируется по имени исходного файла,
+так что при рендере страницы файлы не читаются. Пока варианты не готовы,
+шаблон выводит оригинал, не декодируя его; отметка «не готово» по имени и
+размеру файла лежит в общем кэше 'shared', чтобы рендер не хэшировал файл
+заново, а обработчик снимает ее, подготовив варианты. Если обработчик не
+смог разобрать файл, отметки продлеваются на FAILED_MARKER_TIMEOUT и рендер
+не ставит битый файл в очередь каждые SCHEDULE_MARKER_TIMEOUT.
+
+В шаблонах варианты выводятся тегом {% responsive_image %} из image_tags.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.apps import apps
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import BlogArticle, Product
+from .tasks import enqueue, task
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'variants'
+# Тег EXIF Orientation; значения 5-8 означают поворот на 90 градусов
+EXIF_ORIENTATION = 0x0112
+MANIFEST_CACHE_TIMEOUT = 60 * 60 * 24
+# Отметки о файлах без вариантов видны всем процессам (рендер и обработчик задач)
+STATUS_CACHE_ALIAS = 'shared'
+# Как часто рендер страницы может повторно ставить в очередь один и тот же файл
+SCHEDULE_MARKER_TIMEOUT = 60 * 5
+# Через сколько повторить файл, который обработчик не смог разобрать
+FAILED_MARKER_TIMEOUT = 60 * 60 * 24
+
+# Наборы ширин под места вывода; sizes подсказывает браузеру ширину слота
+IMAGE_PRESETS = {
+    'product_card': {'widths': (240, 480, 720), 'sizes': '(max-width: 767px) 100vw, 360px'},
+    'cart_thumb': {'widths': (160, 320), 'sizes': '160px'},
+    'article': {'widths': (480, 800, 1200), 'sizes': '(max-width: 1200px) 100vw, 1200px'},
+}
+
+# Форматы в порядке предпочтения; последний используется как запасной в <img>
+VARIANT_FORMATS = (
+    ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+# Какие пресеты готовить заранее при сохранении объекта
+MODEL_PRESETS = {
+    Product: ('product_card', 'cart_thumb'),
+    BlogArticle: ('article',),
+}
+
+
+def manifest_cache_key(name, preset):
+    return f'image_variants:{preset}:{name}'
+
+
+def status_cache():
+    return caches[STATUS_CACHE_ALIAS]
+
+
+def pending_cache_key(field_file, preset):
+    # Размер отличает новый файл, загруженный под именем удаленного
+    return f'image_variants_pending:{preset}:{field_file.name}:{field_file.size}'
+
+
+def schedule_marker_key(name):
+    return f'image_variants_scheduled:{name}'
+
+
+def content_hash(field_file):
+    """SHA-256 содержимого файла (первые 20 символов)"""
+    digest = hashlib.sha256()
+    with field_file.storage.open(field_file.name, 'rb') as source:
+        for chunk in iter(lambda: source.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+
+def variant_dir(digest):
+    return posixpath.join(VARIANTS_DIR, digest[:2], digest)
+
+
+def variant_name(digest, width, extension):
+    return posixpath.join(variant_dir(digest), f'{width}w.{extension}')
+
+
+def _target_widths(original_width, widths):
+    """Ширины не больше исходной; узкий оригинал дает один вариант своей ширины"""
+    targets = [width for width in widths if width <= original_width]
+    return targets or [original_width]
+
+
+def _oriented_size(image):
+    """
+    Размер открытого (не декодированного) изображения с учетом EXIF-поворота,
+    как после ImageOps.exif_transpose. EXIF берется только из заголовка:
+    getexif() у PNG без EXIF в заголовке декодировал бы весь файл.
+    """
+    width, height = image.size
+    if 'exif' in image.info and image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def _encode(image, extension, options):
+    from PIL import Image
+
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    if has_alpha:
+        image = image.convert('RGBA')
+        if extension == 'jpeg':
+            # JPEG без прозрачности: подкладываем белый фон
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=extension.upper(), **options)
+    return buffer.getvalue()
+
+
+def build_variants(field_file, preset, generate=True):
+    """
+    Сгенерировать недостающие варианты файла для пресета.
+    Возвращает манифест: хэш, размеры оригинала и список вариантов по форматам.
+    С generate=False ничего не создает и возвращает None, если вариантов нет;
+    оригинал при этом не декодируется, размеры читаются из заголовка.
+    """
+    from PIL import Image, ImageOps
+
+    storage = field_file.storage
+    digest = content_hash(field_file)
+    if not generate and not storage.exists(variant_dir(digest)):
+        # Для этого содержимого еще ничего не создано: оригинал не открываем
+        return None
+    with storage.open(field_file.name, 'rb') as source:
+        original = Image.open(source)
+        if generate:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+            original_width, original_height = original.size
+        else:
+            original_width, original_height = _oriented_size(original)
+
+    variants = {extension: [] for extension, _, _ in VARIANT_FORMATS}
+    for width in _target_widths(original_width, IMAGE_PRESETS[preset]['widths']):
+        height = max(1, round(original_height * width / original_width))
+        resized = None
+        for extension, _, options in VARIANT_FORMATS:
+            name = variant_name(digest, width, extension)
+            if not storage.exists(name):
+                if not generate:
+                    return None
+                if resized is None:
+                    resized = original.resize((width, height), Image.LANCZOS)
+                name = storage.save(name, ContentFile(_encode(resized, extension, options)))
+            variants[extension].append((width, height, name))
+
+    return {
+        'hash': digest,
+        'width': original_width,
+        'height': original_height,
+        'variants': variants,
+    }
+
+
+def get_variants(field_file, preset, generate=True):
+    """
+    Манифест вариантов из кэша; при промахе варианты собираются с диска
+    и, если generate=True, недостающие создаются на месте.
+    Возвращает None, если файла нет, его не удалось прочитать или
+    варианты еще не готовы.
+    """
+    if not field_file:
+        return None
+    key = manifest_cache_key(field_file.name, preset)
+    manifest = cache.get(key)
+    if manifest is None:
+        pending_key = None
+        try:
+            pending_key = pending_cache_key(field_file, preset)
+            if not generate and status_cache().get(pending_key):
+                # Недавно проверяли: вариантов нет, файл не хэшируем
+                return None
+            manifest = build_variants(field_file, preset, generate)
+        except (OSError, ValueError, SyntaxError):
+            # Битый или отсутствующий файл: шаблон покажет оригинал
+            logger.warning('Не удалось подготовить варианты изображения %s', field_file.name, exc_info=True)
+            if generate and pending_key is not None:
+                # Ошибка постоянная: рендер не хэширует файл и не ставит его в очередь снова
+                status_cache().set_many({pending_key: True, schedule_marker_key(field_file.name): True},
+                                        FAILED_MARKER_TIMEOUT)
+            return None
+        if manifest is None:
+            status_cache().set(pending_key, True, SCHEDULE_MARKER_TIMEOUT)
+            return None
+        if generate:
+            status_cache().delete(pending_key)
+        cache.set(key, manifest, MANIFEST_CACHE_TIMEOUT)
+    return manifest
+
+
+def srcset(field_file, manifest, extension):
+    storage = field_file.storage
+    return ', '.join(
+        f'{storage.url(name)} {width}w' for width, _, name in manifest['variants'][extension]
+    )
+
+
+def prepare_variants(instance):
+    """
+    Создать варианты всех пресетов модели для изображения объекта.
+    Storage не перезаписывает файлы, поэтому новая загрузка получает новое
+    имя и промах кэша, а повторное сохранение без смены файла ничего не делает.
+    """
+    field_file = instance.image
+    if not field_file:
+        return
+    for preset in MODEL_PRESETS.get(type(instance), ()):
+        get_variants(field_file, preset)
+
+
+@task('images.prepare_variants')
+def prepare_variants_task(model, pk):
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if instance is not None:
+        prepare_variants(instance)
+
+
+def schedule_variants(instance):
+    """Поставить подготовку вариантов объекта в очередь (без дублей)"""
+    label = instance._meta.label_lower
+    return enqueue(
+        'images.prepare_variants',
+        key=f'image_variants:{label}:{instance.pk}',
+        model=label,
+        pk=instance.pk,
+    )
+
+
+def schedule_variants_once(field_file):
+    """
+    Вызывается из шаблона при отсутствии вариантов: ставит задачу не чаще
+    раза в SCHEDULE_MARKER_TIMEOUT для одного файла (отметка в общем кэше
+    'shared', ее продлевает неудачная обработка; одновременные повторы
+    отсекает ключ задачи в enqueue).
+    """
+    instance = getattr(field_file, 'instance', None)
+    if instance is None or instance.pk is None or type(instance) not in MODEL_PRESETS:
+        return
+    if status_cache().add(schedule_marker_key(field_file.name), True, SCHEDULE_MARKER_TIMEOUT):
+        schedule_variants(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=BlogArticle)
+def prepare_image_variants(sender, instance, raw=False, **kwargs):
+    """Поставить в очередь подготовку вариантов загруженного изображения"""
+    if raw or not instance.image:
+        return
+    schedule_variants(instance)
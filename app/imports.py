@@ -0,0 +1,179 @@
+# app/imports.py
+"""
+Пакетный импорт товаров из фидов поставщиков (CSV и JSONL).
+
+Файл читается построчно, строки собираются в пачки по batch_size и
+записываются одним INSERT ... ON CONFLICT(sku) DO UPDATE
+(bulk_create(update_conflicts=True)), поэтому расход памяти ограничен
+размером пачки, а число запросов не зависит от числа строк в пачке.
+У существующего товара обновляются только поля, которые есть в строке
+фида: файл без колонки description или category их не затирает.
+bulk_create не вызывает сигналы, так что поисковый индекс и кэши
+обновляются здесь же.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .autocomplete import product_index
+from .caching import bump_generation
+from .models import Product
+from .search import SEARCH_INDEXES
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+IMPORT_BATCH_SIZE = 1000
+IMPORT_REQUIRED_FIELDS = ('sku', 'name', 'price')
+# Поля, которые обновляются у существующего товара с тем же артикулом всегда
+IMPORT_UPDATE_FIELDS = ('name', 'price', 'updated_at')
+# и только если колонка есть в фиде
+IMPORT_OPTIONAL_FIELDS = ('description', 'category')
+# Сколько ошибочных строк запоминать для отчета (остальные только считаются)
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportRowError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f'строка {line}: {message}')
+        self.line = line
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def iter_rows(stream, import_format):
+    """Пары (номер строки, словарь) из открытого текстового потока"""
+    if import_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ImportRowError(line_number, f'неверный JSON ({e})')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ImportRowError(line_number, 'ожидается JSON-объект')
+            continue
+        yield line_number, row
+
+
+def build_product(line, row):
+    """
+    Пара (Product, поля для обновления существующего товара) из строки
+    фида или ImportRowError
+    """
+    values = {key: str(value).strip() for key, value in row.items() if key and value is not None}
+    missing = [field for field in IMPORT_REQUIRED_FIELDS if not values.get(field)]
+    if missing:
+        raise ImportRowError(line, f'нет обязательных полей: {", ".join(missing)}')
+    sku_length = Product._meta.get_field('sku').max_length
+    if len(values['sku']) > sku_length:
+        # Обрезанный артикул мог бы совпасть с чужим товаром и перезаписать его
+        raise ImportRowError(line, f'артикул длиннее {sku_length} символов')
+    try:
+        price = Decimal(values['price'].replace(',', '.'))
+    except InvalidOperation:
+        raise ImportRowError(line, f'неверная цена "{values["price"]}"')
+    if not price.is_finite() or price < 0 or price >= 10 ** 8:
+        raise ImportRowError(line, f'неверная цена "{values["price"]}"')
+    product = Product(
+        sku=values['sku'],
+        name=values['name'][:200],
+        description=values.get('description', ''),
+        price=price.quantize(Decimal('0.01')),
+        category=values.get('category') or Product._meta.get_field('category').default,
+    )
+    return product, IMPORT_UPDATE_FIELDS + tuple(field for field in IMPORT_OPTIONAL_FIELDS if field in values)
+
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, error):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+
+def upsert_batch(rows):
+    """
+    Записать пачку пар из build_product(). Повторы артикула внутри пачки
+    схлопываются (побеждает последняя строка). Строки с разным набором
+    колонок (в JSONL) пишутся отдельными INSERT, у CSV набор один.
+    Возвращает (создано, обновлено, id).
+    """
+    by_sku = {product.sku: (product, update_fields) for product, update_fields in rows}
+    skus = list(by_sku)
+    groups = {}
+    for product, update_fields in by_sku.values():
+        groups.setdefault(update_fields, []).append(product)
+    with transaction.atomic():
+        existing = Product.objects.filter(sku__in=skus).count()
+        saved = []
+        for update_fields, products in groups.items():
+            saved += Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=list(update_fields),
+            )
+        ids = [product.pk for product in saved]
+        if None in ids:
+            # СУБД без RETURNING для upsert: id добираем отдельным запросом
+            ids = list(Product.objects.filter(sku__in=skus).order_by().values_list('id', flat=True))
+        SEARCH_INDEXES['product'].rebuild(ids)
+    return len(skus) - existing, existing, ids
+
+
+def import_products(rows, batch_size=IMPORT_BATCH_SIZE, on_batch=None):
+    """
+    Импортировать строки из iter_rows(). on_batch(stats) вызывается после
+    каждой пачки (для отчета о скорости).
+    """
+    stats = ImportStats()
+    batch = []
+
+    def flush():
+        created, updated, _ = upsert_batch(batch)
+        stats.created += created
+        stats.updated += updated
+        batch.clear()
+        if on_batch is not None:
+            on_batch(stats)
+
+    for line, row in rows:
+        stats.rows += 1
+        try:
+            if isinstance(row, ImportRowError):
+                raise row
+            batch.append(build_product(line, row))
+        except ImportRowError as e:
+            stats.add_error(e)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if stats.imported:
+        # Сигналы не срабатывали: сбрасываем кэш страниц и индекс автодополнения
+        bump_generation('products')
+        product_index.reset()
+    return stats
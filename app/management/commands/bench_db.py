@@ -0,0 +1,225 @@
+# app/management/commands/bench_db.py
+"""
+Сравнение пропускной способности чтения SQLite под несколькими процессами.
+
+Каждый режим запускается на свежей копии базы (sqlite3 backup API), рабочая
+база не меняется. Процессы-читатели имитируют воркеры gunicorn: на каждый
+"запрос" - пользователь, страница каталога и счетчик корзины, после запроса
+соединение закрывается или остается открытым по CONN_MAX_AGE, как в
+request_finished. Отдельный процесс-писатель увеличивает количество в
+корзинах с заданной частотой.
+
+  baseline - django.db.backends.sqlite3, rollback journal, новое соединение на запрос
+  tuned    - ENGINE и OPTIONS из settings.DATABASES['default'] (WAL, PRAGMA), CONN_MAX_AGE
+
+Для осмысленных чисел база должна быть наполнена: manage.py seed_scale.
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F, Max, Min
+
+from app.tasks import worker_init
+
+BENCH_ALIAS = 'bench'
+CATALOG_PAGE_SIZE = 24
+BENCH_MODES = ('baseline', 'tuned')
+
+
+def mode_settings(mode):
+    """Настройки соединения для режима и journal_mode копии базы"""
+    if mode == 'baseline':
+        config = {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0, 'OPTIONS': {}}
+        return config, 'DELETE'
+    default = settings.DATABASES['default']
+    config = {
+        'ENGINE': default['ENGINE'],
+        'CONN_MAX_AGE': default.get('CONN_MAX_AGE') or 600,
+        'CONN_HEALTH_CHECKS': default.get('CONN_HEALTH_CHECKS', True),
+        'OPTIONS': default.get('OPTIONS', {}),
+    }
+    return config, 'WAL'
+
+
+def register_alias(config):
+    """Добавить соединение BENCH_ALIAS со значениями по умолчанию Django"""
+    if hasattr(connections._connections, BENCH_ALIAS):
+        # Соединение от предыдущего режима
+        connections[BENCH_ALIAS].close()
+        del connections[BENCH_ALIAS]
+    connections.settings[BENCH_ALIAS] = connections.configure_settings({'default': dict(config)})['default']
+
+
+def copy_database(source, target, journal_mode):
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+        dst.execute(f'PRAGMA journal_mode = {journal_mode}')
+
+
+def id_ranges():
+    from django.contrib.auth.models import User
+
+    from app.models import CartItem, Product
+
+    ranges = {}
+    for key, model in (('users', User), ('products', Product), ('cart_items', CartItem)):
+        bounds = model.objects.using(BENCH_ALIAS).aggregate(low=Min('id'), high=Max('id'))
+        ranges[key] = (bounds['low'] or 0, bounds['high'] or 0)
+    return ranges
+
+
+def read_request(rng, ranges):
+    """Типичный запрос страницы: пользователь, карточки каталога, корзина"""
+    from django.contrib.auth.models import User
+
+    from app.models import CartItem, Product
+
+    user_id = rng.randint(*ranges['users'])
+    User.objects.using(BENCH_ALIAS).filter(pk=user_id).first()
+    start = rng.randint(*ranges['products'])
+    list(
+        Product.objects.using(BENCH_ALIAS)
+        .filter(pk__gte=start).order_by('pk')
+        .values('id', 'name', 'price', 'image', 'category')[:CATALOG_PAGE_SIZE]
+    )
+    CartItem.objects.using(BENCH_ALIAS).filter(cart__user_id=user_id, cart__is_active=True).count()
+
+
+def write_request(rng, ranges):
+    from app.models import CartItem
+
+    item_id = rng.randint(*ranges['cart_items'])
+    with transaction.atomic(using=BENCH_ALIAS):
+        CartItem.objects.using(BENCH_ALIAS).filter(pk=item_id).update(quantity=F('quantity') + 1)
+
+
+def run_worker(role, config, ranges, seed, started, duration, write_rate, results):
+    """Тело процесса: выполнять запросы до истечения duration, вернуть замеры"""
+    worker_init()
+    register_alias(config)
+    connection = connections[BENCH_ALIAS]
+    rng = random.Random(seed)
+    request = read_request if role == 'reader' else write_request
+    interval = 1 / write_rate if role == 'writer' else 0
+    latencies = []
+    errors = 0
+    started.wait()
+    deadline = time.monotonic() + duration
+    while True:
+        begin = time.monotonic()
+        if begin >= deadline:
+            break
+        try:
+            request(rng, ranges)
+        except Exception:
+            errors += 1
+        finally:
+            connection.close_if_unusable_or_obsolete()
+        end = time.monotonic()
+        latencies.append(end - begin)
+        if interval and end - begin < interval:
+            time.sleep(interval - (end - begin))
+    connection.close()
+    results.put((role, latencies, errors))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест чтения SQLite: стандартный бэкенд против WAL и постоянных соединений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Процессов-читателей (как воркеров gunicorn)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Длительность режима, секунд')
+        parser.add_argument('--write-rate', type=float, default=50.0,
+                            help='Записей в корзины в секунду (0 - без писателя)')
+        parser.add_argument('--modes', nargs='+', choices=BENCH_MODES, default=list(BENCH_MODES))
+        parser.add_argument('--tmp-dir', default=None, help='Каталог для копий базы')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        source = str(settings.DATABASES['default']['NAME'])
+        if not os.path.exists(source):
+            raise CommandError(f'База {source} не найдена')
+        workers = max(1, options['workers'])
+        self.stdout.write(f'База: {source}, читателей {workers}, {options["duration"]:.0f} с на режим, '
+                          f'записей {options["write_rate"]:.0f}/с')
+
+        results = {}
+        for mode in options['modes']:
+            with tempfile.TemporaryDirectory(dir=options['tmp_dir']) as tmp_dir:
+                results[mode] = self.run_mode(mode, source, os.path.join(tmp_dir, 'bench.sqlite3'), workers, options)
+            self.report(mode, results[mode])
+
+        if 'baseline' in results and 'tuned' in results and results['baseline']['reads_per_second']:
+            ratio = results['tuned']['reads_per_second'] / results['baseline']['reads_per_second']
+            self.stdout.write(self.style.SUCCESS(f'✅ tuned / baseline: x{ratio:.2f} чтений в секунду'))
+
+    def run_mode(self, mode, source, target, workers, options):
+        config, journal_mode = mode_settings(mode)
+        config['NAME'] = target
+        self.stderr.write(f'  {mode}: копирование базы...')
+        copy_database(source, target, journal_mode)
+        register_alias(config)
+        ranges = id_ranges()
+        if not ranges['products'][1] or not ranges['users'][1]:
+            raise CommandError('В базе нет товаров или пользователей: сначала выполните seed_scale')
+        # Процессы не должны унаследовать открытые соединения (fork)
+        connections.close_all()
+
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        started = context.Event()
+        queue = context.Queue()
+        roles = ['reader'] * workers
+        if options['write_rate'] > 0 and ranges['cart_items'][1]:
+            roles.append('writer')
+        processes = [
+            context.Process(target=run_worker, args=(
+                role, config, ranges, options['seed'] + number, started,
+                options['duration'], options['write_rate'], queue,
+            ))
+            for number, role in enumerate(roles)
+        ]
+        for process in processes:
+            process.start()
+        # Даем процессам подняться, чтобы старт spawn не попал в замер
+        time.sleep(0.5)
+        started.set()
+        collected = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        reads = sorted(latency for role, latencies, _ in collected if role == 'reader' for latency in latencies)
+        writes = [latency for role, latencies, _ in collected if role == 'writer' for latency in latencies]
+        return {
+            'reads': len(reads),
+            'reads_per_second': len(reads) / options['duration'],
+            'read_p50_ms': percentile(reads, 0.50) * 1000,
+            'read_p95_ms': percentile(reads, 0.95) * 1000,
+            'read_p99_ms': percentile(reads, 0.99) * 1000,
+            'read_mean_ms': (statistics.fmean(reads) if reads else 0) * 1000,
+            'writes_per_second': len(writes) / options['duration'],
+            'errors': sum(errors for _, _, errors in collected),
+        }
+
+    def report(self, mode, result):
+        self.stdout.write(
+            f'{mode:>8}: {result["reads_per_second"]:,.0f} чтений/с, '
+            f'p50 {result["read_p50_ms"]:.2f} мс, p95 {result["read_p95_ms"]:.2f} мс, '
+            f'p99 {result["read_p99_ms"]:.2f} мс, записей {result["writes_per_second"]:,.0f}/с, '
+            f'ошибок {result["errors"]}'
+        )
@@ -0,0 +1,456 @@
+# app/management/commands/bench_shop.py
+"""
+Нагрузочный тест магазина по HTTP.
+
+По умолчанию приложение из AvecPlaisirShop/wsgi.py запускается в этом же
+процессе (многопоточный WSGI-сервер Django на свободном порту), с --url
+запросы идут на уже запущенный локальный сервер (runserver, gunicorn) с той
+же базой. Каждый клиент - отдельный поток со своим keep-alive соединением,
+анонимной сессией и сессией вошедшего пользователя bench_<n>. Сценарии
+выбираются случайно по весам BENCH_SCENARIOS (или --mix); редиректы внутри
+сценария проходятся как в браузере, каждый HTTP-запрос замеряется отдельно.
+
+Результат - JSON (p50/p95/p99, запросов в секунду, ошибки по сценариям и
+коммит) в stdout или в --output, чтобы сравнивать прогоны между коммитами.
+Клиенты в режиме in-process делят GIL с сервером: для абсолютных чисел
+используйте --url.
+
+Сценарии пишут в базу (корзины, комментарии, сессии). Уже существующий
+bench_<n> используется, только если у него пароль нагрузки (остался от
+прогона с --keep-data); иначе берется следующий свободный номер. После
+прогона созданные этим запуском пользователи удаляются вместе со своими
+строками, а сессии клиентов - по их cookie; --keep-data оставляет все как есть.
+"""
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import threading
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db.models import Max, Min
+from django.urls import reverse
+
+BENCH_USER_PREFIX = 'bench_'
+BENCH_PASSWORD = 'bench-password'
+# Сценарий -> вес в смеси по умолчанию
+BENCH_SCENARIOS = {
+    'catalog': 35,
+    'blog_list': 15,
+    'article': 15,
+    'add_to_cart': 12,
+    'view_cart': 15,
+    'comment': 3,
+    'search': 5,
+}
+MAX_REDIRECTS = 3
+# Во сколько раз больше случайных id запрашивается, чем нужно строк (id бывают с пропусками)
+SAMPLE_OVERDRAW = 2
+SAMPLE_ATTEMPTS = 5
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class BenchClient:
+    """HTTP-клиент с keep-alive и cookie, как у одного браузера"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.connection = None
+
+    def _connect(self):
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, data=None):
+        """Выполнить запрос; возвращает (статус, Location, размер тела)"""
+        headers = {'Host': f'{self.host}:{self.port}'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        body = None
+        if method == 'POST':
+            body = urlencode(data or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.cookies.get(settings.CSRF_COOKIE_NAME, '')
+        for attempt in range(2):
+            if self.connection is None:
+                self._connect()
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Сервер закрыл keep-alive соединение: одна повторная попытка
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.coded_value
+                else:
+                    self.cookies.pop(name, None)
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+            self.connection = None
+        return response.status, response.getheader('Location'), len(content)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    @property
+    def session_key(self):
+        return self.cookies.get(settings.SESSION_COOKIE_NAME)
+
+
+class Recorder:
+    """Замеры всех потоков: (сценарий, длительность, ошибка)"""
+
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+        self.recording = False
+
+    def add(self, scenario, elapsed, failed):
+        if self.recording:
+            with self.lock:
+                self.samples.append((scenario, elapsed, failed))
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    ordered = sorted(latencies)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 2)
+
+    return {
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'mean': round(sum(ordered) / len(ordered) * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+def summarize(samples, duration):
+    scenarios = {}
+    for scenario in sorted({scenario for scenario, _, _ in samples}):
+        latencies = [elapsed for name, elapsed, _ in samples if name == scenario]
+        scenarios[scenario] = {
+            'requests': len(latencies),
+            'errors': sum(1 for name, _, failed in samples if name == scenario and failed),
+            'rps': round(len(latencies) / duration, 1),
+            'latency_ms': percentiles(latencies),
+        }
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, failed in samples if failed),
+        'rps': round(len(samples) / duration, 1),
+        'latency_ms': percentiles([elapsed for _, elapsed, _ in samples]),
+        'scenarios': scenarios,
+    }
+
+
+def current_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def parse_mix(value):
+    """'catalog=50,view_cart=10' -> веса сценариев (остальные отключаются)"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in BENCH_SCENARIOS:
+            raise argparse.ArgumentTypeError(f'Неизвестный сценарий: {name}. Доступны: {", ".join(BENCH_SCENARIOS)}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'Неверный вес сценария {name}: "{weight}"')
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError('В --mix нет сценариев с положительным весом')
+    return mix
+
+
+class ShopUser:
+    """Поток нагрузки: анонимный посетитель и вошедший пользователь"""
+
+    def __init__(self, base_url, username, data, recorder, rng):
+        self.anonymous = BenchClient(base_url)
+        self.member = BenchClient(base_url)
+        self.username = username
+        self.data = data
+        self.recorder = recorder
+        self.rng = rng
+
+    def login(self):
+        self.member.request('GET', reverse('login'))
+        status, _, _ = self.member.request('POST', reverse('login'), {
+            'username': self.username, 'password': BENCH_PASSWORD,
+        })
+        if status != 302:
+            raise CommandError(f'Не удалось войти как {self.username} (HTTP {status})')
+
+    def fetch(self, scenario, client, method, path, data=None):
+        """Запрос с переходом по редиректам; каждый шаг замеряется"""
+        for _ in range(MAX_REDIRECTS + 1):
+            started = time.perf_counter()
+            try:
+                status, location, _ = client.request(method, path, data)
+            except (http.client.HTTPException, OSError):
+                self.recorder.add(scenario, time.perf_counter() - started, True)
+                return
+            self.recorder.add(scenario, time.perf_counter() - started, status >= 400)
+            if status not in (301, 302, 303) or not location:
+                return
+            method, data = 'GET', None
+            path = urlsplit(urljoin(path, location))._replace(scheme='', netloc='').geturl()
+
+    def run(self, scenario):
+        getattr(self, f'scenario_{scenario}')()
+
+    def scenario_catalog(self):
+        path = reverse('catalog')
+        if self.data['categories'] and self.rng.random() < 0.3:
+            path += '?' + urlencode({'category': self.rng.choice(self.data['categories'])})
+        self.fetch('catalog', self.anonymous, 'GET', path)
+
+    def scenario_blog_list(self):
+        self.fetch('blog_list', self.anonymous, 'GET', reverse('blog_list'))
+
+    def scenario_article(self):
+        article_id = self.rng.choice(self.data['articles'])
+        self.fetch('article', self.anonymous, 'GET', reverse('blog_article_detail', args=[article_id]))
+
+    def scenario_search(self):
+        self.fetch('search', self.anonymous, 'GET', reverse('search') + '?' + urlencode({
+            'q': self.rng.choice(self.data['words']),
+        }))
+
+    def scenario_add_to_cart(self):
+        product_id = self.rng.choice(self.data['products'])
+        self.fetch('add_to_cart', self.member, 'POST', reverse('add_to_cart', args=[product_id]))
+
+    def scenario_view_cart(self):
+        self.fetch('view_cart', self.member, 'GET', reverse('view_cart'))
+
+    def scenario_comment(self):
+        article_id = self.rng.choice(self.data['articles'])
+        self.fetch('comment', self.member, 'POST', reverse('blog_article_detail', args=[article_id]), {
+            'text': f'Комментарий нагрузочного теста {self.rng.randint(1, 10 ** 6)}',
+        })
+
+    def close(self):
+        self.anonymous.close()
+        self.member.close()
+
+    @property
+    def session_keys(self):
+        return [key for key in (self.anonymous.session_key, self.member.session_key) if key]
+
+
+def sample_rows(queryset, fields, sample_size, rng):
+    """
+    Случайные строки (id, *fields) без ORDER BY RANDOM(): случайные id из
+    диапазона [min, max] выбираются по первичному ключу, пропуски в id
+    добираются повторными попытками.
+    """
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    low, high = bounds['low'], bounds['high']
+    if low is None:
+        return []
+    if high - low < sample_size * SAMPLE_OVERDRAW:
+        return list(queryset.order_by('id').values_list('id', *fields)[:sample_size])
+    found = {}
+    for _ in range(SAMPLE_ATTEMPTS):
+        ids = {rng.randint(low, high) for _ in range(sample_size * SAMPLE_OVERDRAW)} - found.keys()
+        for row in queryset.filter(pk__in=ids).values_list('id', *fields):
+            found[row[0]] = row
+        if len(found) >= sample_size:
+            break
+    return list(found.values())[:sample_size]
+
+
+def load_bench_data(rng, sample_size=500):
+    """Случайные id товаров и статей, категории и слова для поиска"""
+    from app.models import BlogArticle, Product
+
+    products = sample_rows(Product.objects.all(), ('name', 'category'), sample_size, rng)
+    articles = sample_rows(BlogArticle.objects.all(), (), sample_size, rng)
+    if not products or not articles:
+        raise CommandError('Нужны товары и статьи: сначала выполните seed_scale')
+    return {
+        'products': [product_id for product_id, _, _ in products],
+        'articles': [article_id for article_id, in articles],
+        'categories': sorted({category for _, _, category in products}),
+        'words': sorted({name.split()[0] for _, name, _ in products if name.split()}),
+    }
+
+
+def ensure_bench_users(count):
+    """
+    count пользователей bench_<n> с паролем нагрузки. Чужие пользователи с
+    таким именем (другой пароль) не трогаются и пропускаются.
+    Возвращает (имена для клиентов, имена созданных этим вызовом).
+    """
+    from django.contrib.auth.models import User
+
+    usernames, created = [], []
+    number = 0
+    while len(usernames) < count:
+        candidates = [f'{BENCH_USER_PREFIX}{n}' for n in range(number, number + count - len(usernames))]
+        number += len(candidates)
+        existing = User.objects.in_bulk(candidates, field_name='username')
+        for username in candidates:
+            user = existing.get(username)
+            if user is None:
+                User.objects.create_user(username, password=BENCH_PASSWORD)
+                created.append(username)
+            elif not user.check_password(BENCH_PASSWORD):
+                continue
+            usernames.append(username)
+    return usernames, created
+
+
+def cleanup_bench_data(usernames, session_keys):
+    """
+    Удалить созданных пользователей нагрузки (их корзины и комментарии удаляются
+    каскадом, с сигналами и пересчетом счетчиков) и сессии клиентов.
+    Возвращает число удаленных строк.
+    """
+    from django.contrib.auth.models import User
+
+    deleted, _ = User.objects.filter(username__in=usernames).delete()
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    for session_key in session_keys:
+        store(session_key).delete()
+    return deleted
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест магазина по HTTP: смесь сценариев, p50/p95/p99 и запросов/с в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=None,
+                            help='Адрес запущенного сервера (по умолчанию приложение запускается в процессе)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=20.0, help='Длительность замера, секунд')
+        parser.add_argument('--warmup', type=float, default=3.0, help='Прогрев без замеров, секунд')
+        parser.add_argument('--mix', type=parse_mix, default=None,
+                            help='Веса сценариев, например catalog=50,view_cart=10')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default=None, help='Файл для JSON (по умолчанию stdout)')
+        parser.add_argument('--keep-data', action='store_true',
+                            help='Не удалять пользователей bench_<n>, их корзины, комментарии и сессии')
+
+    def handle(self, *args, **options):
+        mix = options['mix'] or BENCH_SCENARIOS
+        concurrency = max(1, options['concurrency'])
+        data = load_bench_data(random.Random(options['seed']))
+        usernames, created = ensure_bench_users(concurrency)
+        session_keys = []
+
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            server, base_url = self.start_server()
+        self.stderr.write(f'Цель: {base_url}, клиентов {concurrency}, '
+                          f'прогрев {options["warmup"]:.0f} с, замер {options["duration"]:.0f} с')
+        try:
+            result = self.run_load(base_url, usernames, data, mix, options, session_keys)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if not options['keep_data']:
+                deleted = cleanup_bench_data(created, session_keys)
+                self.stderr.write(f'Данные нагрузки удалены: {deleted} строк, сессий {len(session_keys)}')
+
+        result = {
+            'commit': current_commit(),
+            'target': 'in-process' if options['url'] is None else base_url,
+            'concurrency': concurrency,
+            'duration': options['duration'],
+            'mix': mix,
+            **result,
+        }
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(f'Результат записан в {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def start_server(self):
+        """Поднять AvecPlaisirShop.wsgi.application на свободном порту в фоновом потоке"""
+        from AvecPlaisirShop.wsgi import application
+
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+        server.set_app(application)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        return server, f'http://{host}:{port}'
+
+    def run_load(self, base_url, usernames, data, mix, options, session_keys):
+        """Прогон нагрузки; ключи сессий клиентов добавляются в session_keys"""
+        recorder = Recorder()
+        scenarios = list(mix)
+        weights = [mix[name] for name in scenarios]
+        stop = threading.Event()
+        errors = []
+
+        def client_loop(number):
+            rng = random.Random(options['seed'] + number)
+            user = ShopUser(base_url, usernames[number], data, recorder, rng)
+            try:
+                user.login()
+                while not stop.is_set():
+                    user.run(rng.choices(scenarios, weights)[0])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                user.close()
+                session_keys.extend(user.session_keys)
+
+        threads = [threading.Thread(target=client_loop, args=(number,), daemon=True)
+                   for number in range(len(usernames))]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['warmup'])
+        recorder.recording = True
+        started = time.perf_counter()
+        time.sleep(options['duration'])
+        recorder.recording = False
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise CommandError(f'Клиент нагрузки упал: {errors[0]!r}')
+        return summarize(recorder.samples, elapsed)
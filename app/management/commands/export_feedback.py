@@ -0,0 +1,34 @@
+# app/management/commands/export_feedback.py
+from django.core.management.base import BaseCommand, CommandError
+
+from app.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, feedback_export_queryset, iter_feedback_export
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка отзывов в CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=sorted(EXPORT_FORMATS), default='csv',
+                            help='Формат выгрузки (по умолчанию csv)')
+        parser.add_argument('--from', dest='date_from', help='Начальная дата ГГГГ-ММ-ДД (включительно)')
+        parser.add_argument('--to', dest='date_to', help='Конечная дата ГГГГ-ММ-ДД (включительно)')
+        parser.add_argument('--output', '-o', help='Файл для записи (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Сколько строк читать из БД за один раз')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = feedback_export_queryset(options['date_from'], options['date_to'])
+            chunks = iter_feedback_export(queryset, options['export_format'], options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = options['output']
+        if not output:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'✅ Выгрузка сохранена в {output}'))
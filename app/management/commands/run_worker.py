@@ -0,0 +1,59 @@
+# app/management/commands/run_worker.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app.tasks import claim_tasks, execute_task, requeue_stale, worker_init
+
+
+class Command(BaseCommand):
+    help = 'Обработчик фоновых задач (изображения и другие отложенные задачи)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Размер пула процессов')
+        parser.add_argument('--batch', type=int, default=None,
+                            help='Сколько задач забирать за раз (по умолчанию 2 на процесс)')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Пауза между опросами пустой очереди, секунд')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Через сколько секунд задача в running считается зависшей')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        batch = options['batch'] or processes * 2
+        self.stderr.write(f'🛠 Обработчик запущен: процессов {processes}')
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=worker_init) as pool:
+            try:
+                while True:
+                    requeue_stale(options['stale_after'])
+                    task_ids = claim_tasks(batch)
+                    if not task_ids:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    # Процессы пула создаются по требованию (fork): они не должны
+                    # унаследовать открытое соединение родителя
+                    connections.close_all()
+                    self.run_batch(pool, task_ids)
+            except KeyboardInterrupt:
+                self.stderr.write('Остановка обработчика...')
+
+    def run_batch(self, pool, task_ids):
+        futures = {pool.submit(execute_task, task_id): task_id for task_id in task_ids}
+        for future in as_completed(futures):
+            task_id = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                # Задача останется в running и вернется в очередь через --stale-after
+                self.stderr.write(self.style.ERROR(f'❌ Задача #{task_id}: {e!r}'))
+            else:
+                self.stdout.write(f'Задача #{task_id}: {status}')
@@ -0,0 +1,46 @@
+# app/management/commands/sync_replica.py
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def copy_to_replica(source, target):
+    """
+    Скопировать основную базу в реплику через sqlite3 backup API.
+    Копия пишется одной транзакцией: читатели реплики в режиме WAL
+    видят либо старые, либо новые данные целиком.
+    """
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target, timeout=30)) as dst:
+        dst.execute('PRAGMA journal_mode = WAL')
+        src.backup(dst)
+
+
+class Command(BaseCommand):
+    help = 'Обновить SQLite-реплику для чтения (DB_REPLICA_PATH) копией основной базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Повторять каждые N секунд (0 - один раз)')
+
+    def handle(self, *args, **options):
+        alias = settings.REPLICA_DATABASE
+        if not alias:
+            raise CommandError('Реплика не настроена: задайте переменную окружения DB_REPLICA_PATH')
+        source = str(settings.DATABASES['default']['NAME'])
+        target = str(settings.DATABASES[alias]['NAME'])
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    copy_to_replica(source, target)
+                except sqlite3.Error as e:
+                    raise CommandError(f'Не удалось обновить реплику: {e}')
+                self.stdout.write(f'Реплика {target} обновлена за {time.monotonic() - started:.2f} с')
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stderr.write('Остановка синхронизации...')
@@ -0,0 +1,183 @@
+# app/middleware.py
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.translation import get_language
+
+from .caching import get_generations, page_cache
+from .profiling import check_query_budget, collect_metrics, log_request, server_timing
+from .routers import PIN_SESSION_KEY, replica_alias, replica_reads
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    """
+    Метрики каждого запроса (app/profiling.py): Server-Timing, JSON-строка
+    в лог app.profiling и проверка бюджета SQL-запросов из QUERY_BUDGETS.
+    Стоит первым после SecurityMiddleware, чтобы учитывать запросы сессий,
+    аутентификации и попадания в кэш страниц. У потоковых ответов метрики
+    дописываются и проверяются после отдачи всего тела.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        view_name = self._view_name(request)
+        response['Server-Timing'] = server_timing(metrics, time.perf_counter() - started)
+        if response.streaming and not response.is_async:
+            response.streaming_content = self._finish_streaming(
+                response.streaming_content, request, response, view_name, metrics, started,
+            )
+            return response
+        self._finish(request, response, view_name, metrics, started)
+        return response
+
+    @staticmethod
+    def _finish(request, response, view_name, metrics, started):
+        log_request(request, response, view_name, metrics, time.perf_counter() - started)
+        check_query_budget(view_name, metrics.queries)
+
+    def _finish_streaming(self, content, request, response, view_name, metrics, started):
+        """Тело потокового ответа: запросы генератора считаются в метриках запроса"""
+        with collect_metrics(metrics):
+            yield from content
+        self._finish(request, response, view_name, metrics, started)
+
+    @staticmethod
+    def _view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # Ответ из кэша страниц: представление не вызывалось
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return None
+        return match.view_name
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэш целых страниц для анонимных посетителей.
+
+    Работает только для GET-запросов к страницам из ANONYMOUS_PAGE_CACHE_VIEWS
+    и только без cookie сессии и flash-сообщений, поэтому стоит до
+    SessionMiddleware: при попадании не выполняются ни сессии, ни CSRF, ни
+    представление с шаблоном. Ключ включает адрес, язык и поколения тем
+    данных страницы; ответы, выставляющие cookie (например, CSRF-токен
+    формы), не кэшируются.
+
+    Кэш 'pages' должен быть общим для всех процессов: с LocMemCache сброс
+    поколения после изменения данных видит только один воркер, а остальные
+    продолжают отдавать старые страницы. Поэтому с locmem middleware
+    отключается.
+    """
+    HEADER = 'X-Page-Cache'
+
+    def __init__(self, get_response):
+        if isinstance(page_cache(), LocMemCache):
+            message = 'Кэш страниц отключен: кэш pages (LocMemCache) не общий для процессов'
+            logger.warning(message)
+            raise MiddlewareNotUsed(message)
+        self.get_response = get_response
+        self.views = getattr(settings, 'ANONYMOUS_PAGE_CACHE_VIEWS', {})
+
+    def __call__(self, request):
+        topics = self._page_topics(request)
+        if topics is None:
+            return self.get_response(request)
+
+        key = self._cache_key(request, topics)
+        cache = page_cache()
+        response = cache.get(key)
+        if response is not None:
+            response[self.HEADER] = 'hit'
+            return get_conditional_response(request, etag=response.get('ETag'), response=response)
+
+        # Отметка для ReadReplicaMiddleware: страница, которая попадет в кэш,
+        # строится по основной базе, а не по отстающей реплике
+        request.page_cache_fill = True
+        response = self.get_response(request)
+        if self._can_store(response):
+            cache.set(key, response)
+            response[self.HEADER] = 'miss'
+        return response
+
+    def _page_topics(self, request):
+        """Темы данных страницы или None, если запрос нельзя обслужить из кэша"""
+        if request.method != 'GET':
+            return None
+        cookies = request.COOKIES
+        if settings.SESSION_COOKIE_NAME in cookies or CookieStorage.cookie_name in cookies:
+            return None
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+        return self.views.get(url_name)
+
+    @staticmethod
+    def _cache_key(request, topics):
+        generations = '.'.join(str(generation) for generation in get_generations(topics))
+        url = hashlib.md5(request.build_absolute_uri().encode('utf-8'), usedforsecurity=False).hexdigest()
+        return f'page:{get_language()}:{generations}:{url}'
+
+    @staticmethod
+    def _can_store(response):
+        cache_control = response.get('Cache-Control', '')
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in cache_control
+            and 'no-store' not in cache_control
+        )
+
+
+class ReadReplicaMiddleware:
+    """
+    Чтение с реплики для страниц из REPLICA_READ_VIEWS (app/routers.py).
+
+    Реплика используется только для GET/HEAD и только если сессия не
+    закреплена за основной базой. Запрос, записавший данные магазина,
+    закрепляет сессию до ее окончания. Промахи кэша страниц тоже читают
+    с основной базы: иначе устаревшая страница закэшировалась бы под новым
+    поколением тем. Стоит после SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = frozenset(getattr(settings, 'REPLICA_READ_VIEWS', ()))
+
+    def __call__(self, request):
+        if not replica_alias():
+            return self.get_response(request)
+        with replica_reads(enabled=False) as state:
+            request.db_routing = state
+            response = self.get_response(request)
+        if state.wrote and not request.session.get(PIN_SESSION_KEY):
+            request.session[PIN_SESSION_KEY] = True
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = getattr(request, 'db_routing', None)
+        if (
+            state is not None
+            and request.method in ('GET', 'HEAD')
+            and not getattr(request, 'page_cache_fill', False)
+            and request.resolver_match.url_name in self.views
+            and not request.session.get(PIN_SESSION_KEY)
+        ):
+            state.replica = True
+        return None
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:41
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def merge_duplicate_active_carts(apps, schema_editor):
+    """Слить лишние активные корзины пользователя в самую новую"""
+    Cart = apps.get_model('app', 'Cart')
+    CartItem = apps.get_model('app', 'CartItem')
+    duplicated_users = (
+        Cart.objects.filter(is_active=True)
+        .values('user')
+        .annotate(carts=Count('id'))
+        .filter(carts__gt=1)
+        .values_list('user', flat=True)
+    )
+    for user_id in list(duplicated_users):
+        carts = list(Cart.objects.filter(user_id=user_id, is_active=True).order_by('-created_at', '-id'))
+        keep, extra = carts[0], carts[1:]
+        for item in CartItem.objects.filter(cart__in=extra):
+            merged = CartItem.objects.filter(cart=keep, product_id=item.product_id).update(
+                quantity=F('quantity') + item.quantity
+            )
+            if merged:
+                item.delete()
+            else:
+                item.cart = keep
+                item.save(update_fields=['cart'])
+        Cart.objects.filter(pk__in=[cart.pk for cart in extra]).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_active_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('user',), name='unique_active_cart_per_user'),
+        ),
+    ]
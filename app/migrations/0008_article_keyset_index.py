@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_unique_active_cart'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogarticle',
+            index=models.Index(fields=['-published_date', '-id'], name='article_published_id_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_article_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('approved_comment', True)), fields=['post', 'created_date', 'id'], name='comment_approved_post_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:30
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_feedback_stats(apps, schema_editor):
+    """Посчитать начальную статистику по уже существующим отзывам"""
+    Feedback = apps.get_model('app', 'Feedback')
+    FeedbackStats = apps.get_model('app', 'FeedbackStats')
+    values = Feedback.objects.aggregate(
+        total_count=Count('id'),
+        recommendation_sum=Sum('recommendation'),
+        promoters=Count('id', filter=Q(recommendation__gte=9)),
+        passives=Count('id', filter=Q(recommendation__gte=7, recommendation__lte=8)),
+        detractors=Count('id', filter=Q(recommendation__lte=6)),
+        **{f'rating_{r}': Count('id', filter=Q(overall_rating=str(r))) for r in range(1, 6)},
+    )
+    values['recommendation_sum'] = values['recommendation_sum'] or 0
+    FeedbackStats.objects.update_or_create(pk=1, defaults=values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_comment_approved_post_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_count', models.PositiveIntegerField(default=0, verbose_name='Всего отзывов')),
+                ('recommendation_sum', models.PositiveIntegerField(default=0, verbose_name='Сумма рекомендаций')),
+                ('promoters', models.PositiveIntegerField(default=0, verbose_name='Промоутеры (9-10)')),
+                ('passives', models.PositiveIntegerField(default=0, verbose_name='Нейтралы (7-8)')),
+                ('detractors', models.PositiveIntegerField(default=0, verbose_name='Критики (0-6)')),
+                ('rating_1', models.PositiveIntegerField(default=0, verbose_name='Оценка 1')),
+                ('rating_2', models.PositiveIntegerField(default=0, verbose_name='Оценка 2')),
+                ('rating_3', models.PositiveIntegerField(default=0, verbose_name='Оценка 3')),
+                ('rating_4', models.PositiveIntegerField(default=0, verbose_name='Оценка 4')),
+                ('rating_5', models.PositiveIntegerField(default=0, verbose_name='Оценка 5')),
+            ],
+            options={
+                'verbose_name': 'Статистика отзывов',
+                'verbose_name_plural': 'Статистика отзывов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['-created_at', '-id'], name='feedback_created_id_idx'),
+        ),
+        migrations.RunPython(fill_feedback_stats, migrations.RunPython.noop),
+    ]
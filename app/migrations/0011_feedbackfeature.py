@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+LIKED_FEATURE_CODES = ('design', 'navigation', 'products', 'prices', 'delivery', 'support')
+
+
+def split_liked_features(apps, schema_editor):
+    """Перенести коды из текстового Feedback.liked_features в FeedbackFeature"""
+    Feedback = apps.get_model('app', 'Feedback')
+    FeedbackFeature = apps.get_model('app', 'FeedbackFeature')
+    batch = []
+    rows = Feedback.objects.exclude(liked_features='').values_list('id', 'liked_features')
+    for feedback_id, text in rows.iterator(chunk_size=2000):
+        codes = {code.strip() for code in text.split(',')}
+        batch.extend(
+            FeedbackFeature(feedback_id=feedback_id, feature=code)
+            for code in LIKED_FEATURE_CODES if code in codes
+        )
+        if len(batch) >= 2000:
+            FeedbackFeature.objects.bulk_create(batch)
+            batch = []
+    FeedbackFeature.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_feedbackstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature', models.CharField(choices=[('design', 'Дизайн сайта'), ('navigation', 'Удобная навигация'), ('products', 'Ассортимент товаров'), ('prices', 'Цены'), ('delivery', 'Условия доставки'), ('support', 'Работа поддержки')], max_length=20, verbose_name='Что понравилось')),
+                ('feedback', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='features', to='app.feedback', verbose_name='Отзыв')),
+            ],
+            options={
+                'verbose_name': 'Понравившийся пункт',
+                'verbose_name_plural': 'Понравившиеся пункты',
+                'indexes': [models.Index(fields=['feature', 'feedback'], name='feedback_feature_idx')],
+                'unique_together': {('feedback', 'feature')},
+            },
+        ),
+        migrations.RunPython(split_liked_features, migrations.RunPython.noop),
+    ]
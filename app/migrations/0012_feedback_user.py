@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def link_feedback_to_users(apps, schema_editor):
+    """Привязать существующие отзывы к пользователям по совпадающему email"""
+    Feedback = apps.get_model('app', 'Feedback')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    owner = User.objects.filter(email=OuterRef('email')).order_by('id').values('id')[:1]
+    Feedback.objects.filter(user__isnull=True).exclude(email='').update(user=Subquery(owner))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_feedbackfeature'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='feedbacks', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['user', '-created_at'], name='feedback_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['email'], name='feedback_email_idx'),
+        ),
+        migrations.RunPython(link_feedback_to_users, migrations.RunPython.noop),
+    ]
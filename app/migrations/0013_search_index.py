@@ -0,0 +1,40 @@
+# Полнотекстовые индексы SQLite FTS5 для товаров и статей блога
+
+from django.db import migrations
+
+FTS_TABLES = {
+    'app_product_fts': ('app_product', ('name', 'description', 'category')),
+    'app_blogarticle_fts': ('app_blogarticle', ('title', 'short_content', 'full_content')),
+}
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, (source, columns) in FTS_TABLES.items():
+        columns = ', '.join(columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"{columns}, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {table}(rowid, {columns}) SELECT id, {columns} FROM {source}"
+        )
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in FTS_TABLES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_feedback_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, help_text='Артикул поставщика; по нему manage.py import_products обновляет товары', max_length=64, null=True, unique=True, verbose_name='Артикул'),
+        ),
+    ]
@@ -1,10 +1,31 @@
 ﻿# models.py - ФИНАЛЬНАЯ ВЕРСИЯ
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Count, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+# Варианты ответа «Что вам понравилось на сайте?» (используются формой отзыва)
+LIKED_FEATURE_CHOICES = [
+    ('design', 'Дизайн сайта'),
+    ('navigation', 'Удобная навигация'),
+    ('products', 'Ассортимент товаров'),
+    ('prices', 'Цены'),
+    ('delivery', 'Условия доставки'),
+    ('support', 'Работа поддержки'),
+]
+
+
 class Feedback(models.Model):
     """Модель отзыва"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='feedbacks',
+        verbose_name="Пользователь"
+    )
     name = models.CharField(max_length=100, verbose_name="Имя")
     email = models.EmailField(verbose_name="Email")
     overall_rating = models.CharField(max_length=50, verbose_name="Общая оценка")
@@ -18,10 +39,199 @@ class Feedback(models.Model):
     def __str__(self):
         return f"Отзыв от {self.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные значения, чтобы при изменении отзыва
+        # вычесть из статистики старый вклад, а не пересчитывать ее целиком
+        instance._stats_snapshot = instance.stats_values()
+        return instance
+    
+    def stats_values(self):
+        """Значения, влияющие на FeedbackStats"""
+        return (self.recommendation, self.overall_rating)
+    
+    @staticmethod
+    def parse_liked_features(text):
+        """Коды пунктов из строки вида "design, prices" (неизвестные пропускаются)"""
+        valid = {code for code, _ in LIKED_FEATURE_CHOICES}
+        codes = []
+        for code in (text or '').split(','):
+            code = code.strip()
+            if code in valid and code not in codes:
+                codes.append(code)
+        return codes
+    
+    def set_liked_features(self, codes):
+        """Записать отмеченные пункты в текстовое поле и в таблицу FeedbackFeature"""
+        codes = self.parse_liked_features(','.join(codes))
+        self.liked_features = ', '.join(codes)
+        with transaction.atomic():
+            if self.pk is None:
+                self.save()
+            else:
+                Feedback.objects.filter(pk=self.pk).update(liked_features=self.liked_features)
+                self.features.all().delete()
+            FeedbackFeature.objects.bulk_create([
+                FeedbackFeature(feedback=self, feature=code) for code in codes
+            ])
+    
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
         ordering = ['-created_at']
+        indexes = [
+            # Keyset-пагинация списка отзывов: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='feedback_created_id_idx'),
+            # История отзывов пользователя (my_feedbacks)
+            models.Index(fields=['user', '-created_at'], name='feedback_user_created_idx'),
+            # Поиск старых отзывов по адресу (админка, привязка к пользователю)
+            models.Index(fields=['email'], name='feedback_email_idx'),
+        ]
+
+
+class FeedbackFeatureQuerySet(models.QuerySet):
+    def counts(self):
+        """
+        Сколько раз отмечен каждый пункт - один GROUP BY по индексу feature.
+        Возвращает словарь {код: количество} в порядке LIKED_FEATURE_CHOICES.
+        """
+        grouped = dict(self.order_by().values_list('feature').annotate(total=Count('id')))
+        return {code: grouped.get(code, 0) for code, _ in LIKED_FEATURE_CHOICES}
+
+
+class FeedbackFeature(models.Model):
+    """Пункт «Что понравилось» из отзыва (одна строка на отмеченный пункт)"""
+    feedback = models.ForeignKey(
+        Feedback,
+        on_delete=models.CASCADE,
+        related_name='features',
+        verbose_name="Отзыв"
+    )
+    feature = models.CharField(max_length=20, choices=LIKED_FEATURE_CHOICES, verbose_name="Что понравилось")
+    
+    objects = FeedbackFeatureQuerySet.as_manager()
+    
+    def __str__(self):
+        return self.get_feature_display()
+    
+    class Meta:
+        verbose_name = "Понравившийся пункт"
+        verbose_name_plural = "Понравившиеся пункты"
+        unique_together = ['feedback', 'feature']
+        indexes = [
+            # Подсчет и выборка отзывов по пункту: WHERE feature = 'delivery'
+            models.Index(fields=['feature', 'feedback'], name='feedback_feature_idx'),
+        ]
+
+
+class FeedbackStats(models.Model):
+    """
+    Накопленная статистика отзывов (одна строка).
+    
+    Обновляется сигналами при создании, изменении и удалении Feedback,
+    поэтому страница отзывов не агрегирует всю таблицу на каждый запрос.
+    """
+    SINGLETON_ID = 1
+    RATINGS = ('1', '2', '3', '4', '5')
+    
+    total_count = models.PositiveIntegerField(default=0, verbose_name="Всего отзывов")
+    recommendation_sum = models.PositiveIntegerField(default=0, verbose_name="Сумма рекомендаций")
+    promoters = models.PositiveIntegerField(default=0, verbose_name="Промоутеры (9-10)")
+    passives = models.PositiveIntegerField(default=0, verbose_name="Нейтралы (7-8)")
+    detractors = models.PositiveIntegerField(default=0, verbose_name="Критики (0-6)")
+    rating_1 = models.PositiveIntegerField(default=0, verbose_name="Оценка 1")
+    rating_2 = models.PositiveIntegerField(default=0, verbose_name="Оценка 2")
+    rating_3 = models.PositiveIntegerField(default=0, verbose_name="Оценка 3")
+    rating_4 = models.PositiveIntegerField(default=0, verbose_name="Оценка 4")
+    rating_5 = models.PositiveIntegerField(default=0, verbose_name="Оценка 5")
+    
+    def __str__(self):
+        return f"Статистика отзывов ({self.total_count})"
+    
+    @classmethod
+    def get(cls):
+        """Текущая статистика; строка создается пересчетом при первом обращении"""
+        stats = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        return stats if stats is not None else cls.recalculate()
+    
+    @classmethod
+    def recalculate(cls):
+        """Полностью пересчитать статистику по таблице Feedback"""
+        values = Feedback.objects.aggregate(
+            total_count=Count('id'),
+            recommendation_sum=Coalesce(Sum('recommendation'), Value(0)),
+            promoters=Count('id', filter=Q(recommendation__gte=9)),
+            passives=Count('id', filter=Q(recommendation__gte=7, recommendation__lte=8)),
+            detractors=Count('id', filter=Q(recommendation__lte=6)),
+            **{
+                f'rating_{rating}': Count('id', filter=Q(overall_rating=rating))
+                for rating in cls.RATINGS
+            },
+        )
+        stats, _ = cls.objects.update_or_create(pk=cls.SINGLETON_ID, defaults=values)
+        return stats
+    
+    @classmethod
+    def contribution(cls, recommendation, overall_rating):
+        """Вклад одного отзыва в счетчики"""
+        delta = {'total_count': 1, 'recommendation_sum': recommendation}
+        if recommendation >= 9:
+            delta['promoters'] = 1
+        elif recommendation >= 7:
+            delta['passives'] = 1
+        else:
+            delta['detractors'] = 1
+        if overall_rating in cls.RATINGS:
+            delta[f'rating_{overall_rating}'] = 1
+        return delta
+    
+    @classmethod
+    def apply(cls, added=None, removed=None):
+        """
+        Атомарно применить изменение: added/removed - кортежи
+        (recommendation, overall_rating) добавленного и удаленного отзыва.
+        """
+        delta = {}
+        for values, sign in ((added, 1), (removed, -1)):
+            if values is None:
+                continue
+            for field, value in cls.contribution(*values).items():
+                delta[field] = delta.get(field, 0) + sign * value
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            return
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            **{field: F(field) + value for field, value in delta.items()}
+        )
+        if not updated:
+            cls.recalculate()
+    
+    @property
+    def average_recommendation(self):
+        if not self.total_count:
+            return 0
+        return round(self.recommendation_sum / self.total_count, 1)
+    
+    @property
+    def nps(self):
+        """Net Promoter Score: доля промоутеров минус доля критиков, в процентах"""
+        if not self.total_count:
+            return 0
+        return round((self.promoters - self.detractors) * 100 / self.total_count)
+    
+    def rating_histogram(self):
+        """Список (оценка, количество, процент) от 5 до 1"""
+        histogram = []
+        for rating in reversed(self.RATINGS):
+            count = getattr(self, f'rating_{rating}')
+            percent = round(count * 100 / self.total_count) if self.total_count else 0
+            histogram.append((rating, count, percent))
+        return histogram
+    
+    class Meta:
+        verbose_name = "Статистика отзывов"
+        verbose_name_plural = "Статистика отзывов"
 
 
 class Souvenir(models.Model):
@@ -67,7 +277,10 @@ class BlogArticle(models.Model):
         return self.full_content
     
     def get_comments_count(self):
-        """Получить количество комментариев"""
+        """Получить количество комментариев (из аннотации, если она есть)"""
+        comments_count = getattr(self, 'comments_count', None)
+        if comments_count is not None:
+            return comments_count
         return self.comments.filter(approved_comment=True).count()
     
     def get_comments(self):
@@ -78,6 +291,10 @@ class BlogArticle(models.Model):
         verbose_name = "Статья блога"
         verbose_name_plural = "Статьи блога"
         ordering = ['-published_date']
+        indexes = [
+            # Keyset-пагинация ленты блога: ORDER BY published_date DESC, id DESC
+            models.Index(fields=['-published_date', '-id'], name='article_published_id_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -110,10 +327,27 @@ class Comment(models.Model):
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ['-created_date']
+        indexes = [
+            # Лента одобренных комментариев статьи: WHERE post_id = ? AND approved_comment
+            # ORDER BY created_date DESC, id DESC. Скрытые комментарии в индекс не попадают.
+            models.Index(
+                fields=['post', 'created_date', 'id'],
+                condition=models.Q(approved_comment=True),
+                name='comment_approved_post_idx',
+            ),
+        ]
 
 
 class Product(models.Model):
     """Модель товара"""
+    sku = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="Артикул",
+        help_text="Артикул поставщика; по нему manage.py import_products обновляет товары"
+    )
     name = models.CharField(max_length=200, verbose_name="Название")
     description = models.TextField(verbose_name="Описание", blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
@@ -143,6 +377,86 @@ class Product(models.Model):
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ['name']
+        indexes = [
+            # Keyset-пагинация каталога: ORDER BY name, id
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            # Фильтр по категории с той же сортировкой
+            models.Index(fields=['category', 'name', 'id'], name='product_category_name_id_idx'),
+        ]
+
+
+# Тип результата для денежных выражений (цена × количество)
+PRICE_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+# СУБД с UPDATE ... RETURNING. Признак can_return_columns_from_insert говорит
+# только об INSERT: MariaDB поддерживает INSERT ... RETURNING, но не UPDATE
+UPDATE_RETURNING_VENDORS = ('sqlite', 'postgresql')
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_line_totals(self):
+        """Добавить к каждой позиции line_total = quantity * product.price"""
+        return self.annotate(
+            line_total=ExpressionWrapper(F('quantity') * F('product__price'), output_field=PRICE_FIELD)
+        )
+    
+    def add_for_user(self, user, product_id, quantity=1):
+        """
+        Атомарно добавить товар в активную корзину пользователя.
+        
+        Обычный случай (товар уже в корзине) - один UPDATE quantity = quantity + N.
+        Иначе создается позиция; если параллельный запрос успел вставить ее
+        первым, срабатывает unique_together и выполняется тот же UPDATE.
+        Возвращает True, если позиция была создана.
+        """
+        if self.increment_for_user(user, product_id, quantity) is not None:
+            return False
+        return self.create_for_user(user, product_id, quantity)
+    
+    def increment_for_user(self, user, product_id, quantity=1):
+        """
+        UPDATE quantity = quantity + N позиции товара в активной корзине.
+        Возвращает название товара или None, если позиции нет. Название
+        приходит из RETURNING того же UPDATE, без отдельного SELECT.
+        """
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        increment = self.using(using).filter(
+            cart__user=user, cart__is_active=True, product_id=product_id
+        )
+        if connection.vendor not in UPDATE_RETURNING_VENDORS:
+            # СУБД без UPDATE ... RETURNING: название товара отдельным запросом
+            if not increment.update(quantity=F('quantity') + quantity):
+                return None
+            return Product.objects.using(using).values_list('name', flat=True).get(pk=product_id)
+        quote = connection.ops.quote_name
+        item_table = quote(self.model._meta.db_table)
+        sql = (
+            f'UPDATE {item_table} SET quantity = quantity + %s '
+            f'WHERE product_id = %s AND cart_id IN '
+            f'(SELECT id FROM {quote(Cart._meta.db_table)} WHERE user_id = %s AND is_active) '
+            f'RETURNING (SELECT name FROM {quote(Product._meta.db_table)} '
+            f'WHERE id = {item_table}.product_id)'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [quantity, product_id, user.pk])
+            row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def create_for_user(self, user, product_id, quantity=1):
+        """
+        Вставить позицию в активную корзину (создав корзину при необходимости).
+        Если позицию первым вставил параллельный запрос, увеличивает количество.
+        Возвращает True, если позиция была создана.
+        """
+        cart, _ = Cart.objects.get_or_create(user=user, is_active=True)
+        try:
+            with transaction.atomic():
+                self.create(cart=cart, product_id=product_id, quantity=quantity)
+            return True
+        except IntegrityError:
+            self.increment_for_user(user, product_id, quantity)
+            return False
 
 
 class Cart(models.Model):
@@ -159,12 +473,23 @@ class Cart(models.Model):
     def __str__(self):
         return f"Корзина пользователя {self.user.username}"
     
+    def totals(self):
+        """
+        Итоги корзины одним запросом: стоимость, число позиций и штук.
+        Сумма считается в БД как SUM(quantity * product.price).
+        """
+        return self.items.aggregate(
+            total_price=Coalesce(
+                Sum(F('quantity') * F('product__price'), output_field=PRICE_FIELD),
+                Value(0), output_field=PRICE_FIELD
+            ),
+            items_count=Count('id'),
+            total_quantity=Coalesce(Sum('quantity'), Value(0)),
+        )
+    
     def total_price(self):
         """Общая стоимость товаров в корзине"""
-        total = 0
-        for item in self.items.all():
-            total += item.quantity * item.product.price
-        return total
+        return self.totals()['total_price']
     
     def total_items(self):
         """Общее количество товаров в корзине"""
@@ -173,6 +498,15 @@ class Cart(models.Model):
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
+        constraints = [
+            # Не больше одной активной корзины на пользователя (get_or_create
+            # опирается на это ограничение при одновременных запросах)
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(is_active=True),
+                name='unique_active_cart_per_user',
+            ),
+        ]
 
 
 class CartItem(models.Model):
@@ -191,11 +525,16 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1, verbose_name="Количество")
     added_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата добавления")
     
+    objects = CartItemQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
     
     def item_price(self):
-        """Цена за количество товаров"""
+        """Цена за количество товаров (берется из аннотации, если она есть)"""
+        line_total = getattr(self, 'line_total', None)
+        if line_total is not None:
+            return line_total
         return self.quantity * self.product.price
     
     class Meta:
@@ -221,8 +560,55 @@ class UserProfile(models.Model):
         verbose_name_plural = "Профили пользователей"
 
 
+class Task(models.Model):
+    """
+    Отложенная задача для фонового обработчика (manage.py run_worker).
+    
+    Ставится в очередь через app.tasks.enqueue(); name указывает на функцию
+    из реестра app.tasks, payload передается ей как именованные аргументы.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+    
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    key = models.CharField(
+        max_length=200, blank=True, default='', verbose_name="Ключ",
+        help_text="Задачи с одинаковым ключом не дублируются в очереди"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name="Максимум попыток")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Выполнить после")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взята в работу")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+    
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
+        indexes = [
+            # Выборка очереди: WHERE status = 'pending' AND run_after <= now ORDER BY run_after, id
+            models.Index(fields=['status', 'run_after', 'id'], name='task_queue_idx'),
+            models.Index(fields=['key', 'status'], name='task_key_idx'),
+        ]
+
+
 # Сигнал для автоматического создания профиля пользователя при регистрации
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 @receiver(post_save, sender=User)
@@ -237,4 +623,29 @@ def save_user_profile(sender, instance, **kwargs):
     try:
         instance.userprofile.save()
     except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+        UserProfile.objects.create(user=instance)
+
+
+# Сигналы для поддержания FeedbackStats (срабатывают и для удаления
+# через delete_feedback, и для действий в FeedbackAdmin)
+@receiver(post_save, sender=Feedback)
+def update_feedback_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """Учесть новый или измененный отзыв в статистике"""
+    if raw:
+        return
+    current = instance.stats_values()
+    if created:
+        FeedbackStats.apply(added=current)
+    else:
+        previous = getattr(instance, '_stats_snapshot', None)
+        if previous is None:
+            FeedbackStats.recalculate()
+        elif previous != current:
+            FeedbackStats.apply(added=current, removed=previous)
+    instance._stats_snapshot = current
+
+@receiver(post_delete, sender=Feedback)
+def update_feedback_stats_on_delete(sender, instance, **kwargs):
+    """Убрать удаленный отзыв из статистики"""
+    previous = getattr(instance, '_stats_snapshot', None) or instance.stats_values()
+    FeedbackStats.apply(removed=previous)
\ No newline at end of file
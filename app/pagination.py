@@ -0,0 +1,141 @@
+# app/pagination.py
+"""
+Keyset (курсорная) пагинация.
+
+В отличие от OFFSET/LIMIT страница выбирается условием по ключу сортировки
+(например, (name, id) > (последнее_name, последний_id)), поэтому стоимость
+запроса не зависит от номера страницы и опирается на составной индекс.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder с полной точностью времени: он обрезает datetime до
+    миллисекунд, и курсор по полю с микросекундами указывал бы не на
+    граничную строку (страницы теряли или повторяли строки).
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Упаковать значения ключа сортировки в строку для URL"""
+    raw = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, model, fields):
+    """
+    Распаковать курсор и привести значения к типам полей модели.
+    Возвращает None, если курсор поврежден.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(fields, values)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _keyset_filter(fields, values, forward):
+    """
+    Построить условие «строка идет после/до курсора» для кортежа полей:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(fields, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _reverse_ordering(fields):
+    return [field[1:] if field.startswith('-') else '-' + field for field in fields]
+
+
+class KeysetPage:
+    """Страница результатов keyset-пагинации"""
+
+    def __init__(self, object_list, fields, has_next, has_previous):
+        self.object_list = object_list
+        self.fields = fields
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def _cursor_for(self, obj):
+        # Строки из .values() - словари, обычные queryset - объекты моделей
+        if isinstance(obj, dict):
+            return encode_cursor(obj[field.lstrip('-')] for field in self.fields)
+        return encode_cursor(getattr(obj, field.lstrip('-')) for field in self.fields)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self._cursor_for(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self._cursor_for(self.object_list[0])
+        return None
+
+
+def keyset_paginate(queryset, fields, after=None, before=None, per_page=24):
+    """
+    Получить одну страницу queryset, упорядоченного по fields.
+
+    fields должен однозначно упорядочивать строки (последним полем обычно
+    идет id). Выбирается не больше per_page + 1 строк. queryset может быть
+    и .values(): тогда поля сортировки должны входить в выбранные столбцы.
+    """
+    fields = list(fields)
+    model = queryset.model
+    after_values = decode_cursor(after, model, fields)
+    before_values = decode_cursor(before, model, fields) if after_values is None else None
+
+    if before_values is not None:
+        rows = list(
+            queryset.filter(_keyset_filter(fields, before_values, forward=False))
+            .order_by(*_reverse_ordering(fields))[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        return KeysetPage(rows, fields, has_next=True, has_previous=has_previous)
+
+    if after_values is not None:
+        queryset = queryset.filter(_keyset_filter(fields, after_values, forward=True))
+    rows = list(queryset.order_by(*fields)[:per_page + 1])
+    has_next = len(rows) > per_page
+    return KeysetPage(rows[:per_page], fields, has_next=has_next, has_previous=after_values is not None)
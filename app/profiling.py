@@ -0,0 +1,139 @@
+# app/profiling.py
+"""
+Метрики запроса: число и время SQL-запросов, время рендеринга шаблонов,
+размер ответа.
+
+QueryBudgetMiddleware считает SQL через connection.execute_wrapper()
+на всех соединениях, а время шаблонов - через бэкенд TimedDjangoTemplates
+(settings.TEMPLATES). Метрики уходят в заголовок Server-Timing и в лог
+app.profiling одной JSON-строкой. Если представление выполнило больше
+запросов, чем разрешено в settings.QUERY_BUDGETS (имя URL с пространством
+имен, например 'admin:app_feedback_changelist' -> число),
+пишется предупреждение, а при QUERY_BUDGET_STRICT (его включает тестовый
+раннер AvecPlaisirShop.runner) запрос падает с QueryBudgetExceeded - так N+1
+ловится тестами.
+
+У потоковых ответов (api_products, export_feedback) запросы выполняются
+при отдаче тела, уже после выхода из представления: для них лог и проверка
+бюджета выполняются в конце потока, а Server-Timing (заголовки уходят
+раньше тела) показывает только время до начала отдачи.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper: считает запросы и их время"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+
+@contextmanager
+def collect_metrics(metrics=None):
+    """
+    Считать SQL и шаблоны внутри блока на всех соединениях текущего потока.
+    Переданные metrics продолжают счет (например, при отдаче потокового ответа).
+    """
+    if metrics is None:
+        metrics = RequestMetrics()
+    token = _current_metrics.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+def query_budget(view_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+def check_query_budget(view_name, queries):
+    """Предупреждение или QueryBudgetExceeded (строгий режим) при превышении бюджета"""
+    budget = query_budget(view_name)
+    if budget is None or queries <= budget:
+        return
+    message = f'Представление {view_name}: {queries} SQL-запросов при бюджете {budget}'
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def server_timing(metrics, total):
+    """Значение заголовка Server-Timing (длительности в миллисекундах)"""
+    return (
+        f'sql;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries", '
+        f'tpl;dur={metrics.template_time * 1000:.1f}, '
+        f'total;dur={total * 1000:.1f}'
+    )
+
+
+def log_request(request, response, view_name, metrics, total):
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'view': view_name,
+        'status': response.status_code,
+        'queries': metrics.queries,
+        'sql_ms': round(metrics.sql_time * 1000, 2),
+        'template_ms': round(metrics.template_time * 1000, 2),
+        'total_ms': round(total * 1000, 2),
+        # Размер потокового ответа заранее неизвестен
+        'bytes': None if response.streaming else len(response.content),
+    }
+    logger.info(json.dumps(record, ensure_ascii=False), extra={'request_metrics': record})
+    return record
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Вложенный render_to_string уже учтен во внешнем шаблоне
+        metrics._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд DjangoTemplates, отмечающий время рендеринга в метриках запроса"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
@@ -0,0 +1,84 @@
+# app/routers.py
+"""
+Чтение с реплики базы данных.
+
+Реплика включается переменной окружения DB_REPLICA_PATH (settings.REPLICA_DATABASE
+становится 'replica'); локально это копия SQLite-файла, которую обновляет
+manage.py sync_replica. Запись всегда идет в default.
+
+Чтения уходят на реплику только внутри replica_reads(): его включает
+ReadReplicaMiddleware для GET-страниц из settings.REPLICA_READ_VIEWS.
+Пользователи, сессии, профили и очередь задач всегда читаются с основной
+базы. После записи в модели магазина сессия закрепляется за основной
+базой (read-your-writes): реплика может отставать на интервал копирования.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Сессия с этим ключом читает только с основной базы
+PIN_SESSION_KEY = '_db_pinned'
+PRIMARY_ONLY_APPS = ('admin', 'auth', 'contenttypes', 'sessions')
+PRIMARY_ONLY_MODELS = ('app.task', 'app.userprofile')
+
+
+class RoutingState:
+    def __init__(self, replica=False):
+        self.replica = replica
+        self.wrote = False
+
+
+_routing_state = ContextVar('db_routing_state', default=None)
+
+
+def replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+def uses_replica(model):
+    meta = model._meta
+    return meta.app_label not in PRIMARY_ONLY_APPS and meta.label_lower not in PRIMARY_ONLY_MODELS
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Контекст (или декоратор) запроса: внутри него чтения могут идти с реплики"""
+    token = _routing_state.set(RoutingState(replica=enabled))
+    try:
+        yield _routing_state.get()
+    finally:
+        _routing_state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        alias = replica_alias()
+        if alias and state is not None and state.replica and uses_replica(model):
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        alias = replica_alias()
+        if not alias:
+            return None
+        state = _routing_state.get()
+        if state is not None and uses_replica(model):
+            state.wrote = True
+        # Явно: иначе Django записал бы объект в базу, из которой он прочитан
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = replica_alias()
+        if alias and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, alias}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = replica_alias()
+        if alias and db == alias:
+            # Реплика - копия основной базы, схема приходит вместе с данными
+            return False
+        return None
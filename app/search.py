@@ -0,0 +1,202 @@
+# app/search.py
+"""
+Полнотекстовый поиск по товарам и статьям блога.
+
+Для каждой модели в SQLite создается виртуальная таблица FTS5 (rowid
+совпадает с id объекта). Таблицы обновляются сигналами post_save и
+post_delete, а запросы ранжируются по bm25 и возвращают подсвеченный
+фрагмент текста. На других СУБД поиск откатывается к icontains.
+"""
+import re
+
+from django.contrib import messages
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .models import BlogArticle, Product
+
+# Маркеры подсветки внутри snippet(); заменяются на <mark> после экранирования
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+SNIPPET_TOKENS = 16
+
+
+class SearchIndex:
+    """FTS5-таблица для одной модели"""
+
+    def __init__(self, model, table, fields, weights, snippet_field):
+        self.model = model
+        self.table = table
+        self.fields = fields
+        self.weights = weights
+        self.snippet_column = fields.index(snippet_field)
+
+    @staticmethod
+    def is_supported():
+        return connection.vendor == 'sqlite'
+
+    def populate_sql(self):
+        """Заполнить индекс из основной таблицы одним INSERT ... SELECT"""
+        columns = ', '.join(self.fields)
+        return (
+            f"INSERT INTO {self.table}(rowid, {columns}) "
+            f"SELECT id, {columns} FROM {self.model._meta.db_table}"
+        )
+
+    def index(self, obj):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [obj.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, {', '.join(self.fields)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(self.fields))})",
+                [obj.pk] + [getattr(obj, field) or '' for field in self.fields],
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [pk])
+
+    def rebuild(self, pks=None):
+        """Переиндексировать все объекты или только объекты с указанными id"""
+        if not self.is_supported():
+            return
+        with connection.cursor() as cursor:
+            if pks is None:
+                cursor.execute(f"DELETE FROM {self.table}")
+                cursor.execute(self.populate_sql())
+                return
+            pks = list(pks)
+            for start in range(0, len(pks), 500):
+                chunk = pks[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", chunk)
+                cursor.execute(f"{self.populate_sql()} WHERE id IN ({placeholders})", chunk)
+
+    def match(self, query, limit):
+        """Список (id, фрагмент) по убыванию релевантности"""
+        expression = build_match_expression(query)
+        if not expression:
+            return []
+        if not self.is_supported():
+            return self._match_fallback(query, limit)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({self.table}, %s, %s, %s, '…', %s) "
+                f"FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}) LIMIT %s",
+                [self.snippet_column, _MARK_START, _MARK_END, SNIPPET_TOKENS, expression, limit],
+            )
+            return cursor.fetchall()
+
+    def _match_fallback(self, query, limit):
+        condition = Q()
+        for word in _WORD_RE.findall(query):
+            word_condition = Q()
+            for field in self.fields:
+                word_condition |= Q(**{f'{field}__icontains': word})
+            condition &= word_condition
+        snippet_field = self.fields[self.snippet_column]
+        rows = self.model.objects.filter(condition).values_list('pk', snippet_field)[:limit]
+        return [(pk, Truncator(text or '').words(SNIPPET_TOKENS)) for pk, text in rows]
+
+    def search(self, query, limit=20):
+        """Объекты модели по релевантности с атрибутом search_snippet"""
+        matches = self.match(query, limit)
+        objects = self.model.objects.in_bulk([pk for pk, _ in matches])
+        results = []
+        for pk, snippet in matches:
+            obj = objects.get(pk)
+            if obj is not None:
+                obj.search_snippet = highlight(snippet)
+                results.append(obj)
+        return results
+
+    def search_ids(self, query, limit=1000):
+        return [pk for pk, _ in self.match(query, limit)]
+
+
+def build_match_expression(query):
+    """
+    Превратить пользовательский ввод в безопасное выражение FTS5:
+    каждое слово берется в кавычки как префикс, слова объединяются через AND.
+    """
+    words = _WORD_RE.findall(query or '')
+    return ' '.join(f'"{word}"*' for word in words[:10])
+
+
+def highlight(snippet):
+    """Экранировать фрагмент и подсветить совпадения тегом <mark>"""
+    text = escape(snippet)
+    return mark_safe(text.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+SEARCH_INDEXES = {
+    'product': SearchIndex(
+        Product, 'app_product_fts', ('name', 'description', 'category'),
+        weights=(10.0, 2.0, 4.0), snippet_field='description',
+    ),
+    'article': SearchIndex(
+        BlogArticle, 'app_blogarticle_fts', ('title', 'short_content', 'full_content'),
+        weights=(10.0, 4.0, 1.0), snippet_field='full_content',
+    ),
+}
+
+
+def _index_for(model):
+    for search_index in SEARCH_INDEXES.values():
+        if search_index.model is model:
+            return search_index
+    return None
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=BlogArticle)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Переиндексировать сохраненный товар или статью"""
+    search_index = _index_for(sender)
+    if raw or not search_index.is_supported():
+        return
+    search_index.index(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=BlogArticle)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Удалить товар или статью из поискового индекса"""
+    search_index = _index_for(sender)
+    if not search_index.is_supported():
+        return
+    search_index.remove(instance.pk)
+
+
+class FullTextSearchAdminMixin:
+    """
+    Поиск в админке через FTS-индекс вместо icontains по всем search_fields.
+    В классе админки нужно указать search_index - ключ из SEARCH_INDEXES.
+    Если совпадений больше search_results_limit, id не усекаются молча:
+    выполняется обычный поиск по search_fields с предупреждением.
+    """
+    search_index = None
+    search_results_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        search_index = SEARCH_INDEXES.get(self.search_index)
+        if not search_term or search_index is None or not search_index.is_supported():
+            return super().get_search_results(request, queryset, search_term)
+        ids = search_index.search_ids(search_term, limit=self.search_results_limit + 1)
+        if len(ids) > self.search_results_limit:
+            self.message_user(
+                request,
+                f'Найдено больше {self.search_results_limit} совпадений в полнотекстовом индексе, '
+                f'показаны результаты обычного поиска.',
+                messages.WARNING,
+            )
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=ids), False
@@ -0,0 +1,350 @@
+# app/seeding.py
+"""
+Генерация синтетических данных для нагрузочного тестирования (manage.py seed_scale).
+
+Все значения берутся из random.Random(seed), поэтому один и тот же seed дает
+одни и те же строки (даты отсчитываются от начала текущего дня). Популярность
+товаров, статей и активность пользователей распределены по Ципфу: небольшая
+доля объектов получает большую часть корзин и комментариев, как в реальном
+магазине. Строки пишутся bulk_create пачками в отдельных транзакциях.
+"""
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import capfirst
+
+from .autocomplete import product_index
+from .caching import bump_generation
+from .forms import FeedbackForm
+from .models import (
+    LIKED_FEATURE_CHOICES, BlogArticle, Cart, CartItem, Comment, Feedback, FeedbackFeature,
+    FeedbackStats, Product, UserProfile,
+)
+from .search import SEARCH_INDEXES
+
+SEED_BATCH_SIZE = 5000
+# Объемы при --scale 1 (около 60 тысяч строк вместе с профилями, отзывами и
+# корзинами); --scale 16 дает порядка миллиона
+SEED_DEFAULTS = {
+    'users': 2000,
+    'products': 5000,
+    'articles': 200,
+    'comments': 20000,
+    'feedback': 10000,
+}
+SEED_CART_RATIO = 0.3
+SEED_HISTORY_DAYS = 730
+SEED_PASSWORD = 'password'
+
+_ADJECTIVES = [
+    'Керамическая', 'Стальная', 'Льняная', 'Хлопковая', 'Деревянная', 'Стеклянная',
+    'Фарфоровая', 'Кожаная', 'Винтажная', 'Подарочная', 'Дорожная', 'Праздничная',
+]
+_NOUNS = [
+    'кружка', 'фляжка', 'сумка', 'тарелка', 'свеча', 'открытка', 'закладка', 'шкатулка',
+    'косметичка', 'подставка', 'салфетка', 'ваза', 'брошь', 'рамка', 'чашка', 'магнит',
+]
+_THEMES = [
+    'Avec Plaisir', 'Париж', 'Прованс', 'Лаванда', 'Круассан', 'Монмартр', 'Бордо',
+    'Нормандия', 'Лувр', 'Эйфелева башня', 'Сена', 'Версаль',
+]
+_CATEGORIES = ['сувениры', 'посуда', 'аксессуары', 'декор', 'текстиль', 'канцелярия', 'подарочные наборы']
+_SENTENCES = [
+    'Изделие выполнено вручную небольшой мастерской.',
+    'Подходит для подарка друзьям и близким.',
+    'Упаковано в фирменную коробку с лентой.',
+    'Рисунок нанесен стойкой краской и не стирается.',
+    'Размер и вес указаны в характеристиках товара.',
+    'Вдохновлено улицами старого Парижа и утренним кофе.',
+    'Можно мыть в посудомоечной машине.',
+    'Ограниченная серия, повторного выпуска не будет.',
+]
+_ARTICLE_TOPICS = [
+    'Как выбрать подарок', 'Французские традиции', 'Новинки сезона', 'История бренда',
+    'Советы по уходу', 'Интервью с мастером', 'Праздничный каталог', 'Путешествие по Франции',
+]
+_COMMENTS = [
+    'Спасибо, очень полезно!', 'Купила такую кружку, очень довольна.', 'Когда будет продолжение?',
+    'Отличная статья, сохранила в закладки.', 'А доставка в регионы есть?', 'Красиво написано.',
+    'Не согласен с автором, но читать было интересно.', 'Ждем новых поступлений!',
+]
+_FIRST_NAMES = ['Анна', 'Мария', 'Иван', 'Петр', 'Елена', 'Ольга', 'Сергей', 'Дмитрий', 'Наталья', 'Алексей']
+_LAST_NAMES = ['Иванова', 'Смирнов', 'Кузнецова', 'Попов', 'Соколова', 'Лебедев', 'Козлова', 'Новиков']
+# Оценки сайта: (оценка, вес, средняя рекомендация 0-10)
+_RATINGS = [('5', 45, 9), ('4', 30, 8), ('3', 12, 6), ('2', 8, 3), ('1', 5, 1)]
+_VISIT_WEIGHTS = [25, 35, 20, 15, 5]
+
+
+class ZipfSampler:
+    """Выбор элементов с вероятностью ~ 1 / rank**s (ранги перемешаны)"""
+
+    def __init__(self, rng, items, s=1.1):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(1 / rank ** s for rank in range(1, len(self.items) + 1)))
+
+    def sample(self, k=1):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def one(self):
+        return self.sample(1)[0]
+
+    def distinct(self, k):
+        """До k разных элементов (популярные попадают чаще)"""
+        k = min(k, len(self.items))
+        chosen = dict.fromkeys(self.sample(k))
+        attempts = 0
+        while len(chosen) < k and attempts < 10 * k:
+            chosen.setdefault(self.one())
+            attempts += 1
+        return list(chosen)
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Отключить auto_now/auto_now_add, чтобы записать даты из прошлого"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class ScaleSeeder:
+    def __init__(self, seed=42, batch_size=SEED_BATCH_SIZE, zipf_s=1.1, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.zipf_s = zipf_s
+        self.log = log or (lambda message: None)
+        self.now = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.rows = {}
+
+    # ---- общие помощники ----
+
+    def _past(self, days=SEED_HISTORY_DAYS):
+        """Дата в прошлом; недавние даты встречаются чаще (треугольное распределение)"""
+        return self.now - timedelta(seconds=int(self.rng.triangular(0, days * 86400, 0)))
+
+    def _between(self, start):
+        return start + (self.now - start) * self.rng.random()
+
+    def _zipf(self, items):
+        return ZipfSampler(self.rng, items, self.zipf_s)
+
+    def _bulk(self, model, objects):
+        """
+        Записать объекты пачками; возвращает список id в порядке объектов.
+        id берутся из RETURNING, а если СУБД его не поддерживает - по
+        последним строкам таблицы (генератор пишет в базу один).
+        """
+        ids = []
+        started = time.monotonic()
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                ids.extend(self._insert(model, batch))
+                batch = []
+        if batch:
+            ids.extend(self._insert(model, batch))
+        self.rows[model._meta.label] = self.rows.get(model._meta.label, 0) + len(ids)
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.log(f'{capfirst(model._meta.verbose_name_plural)}: {len(ids)} строк ({len(ids) / elapsed:,.0f} строк/с)')
+        return ids
+
+    @staticmethod
+    def _insert(model, batch):
+        with transaction.atomic():
+            created = model.objects.bulk_create(batch)
+            ids = [obj.pk for obj in created]
+            if None in ids:
+                ids = list(model.objects.order_by('-pk').values_list('pk', flat=True)[:len(batch)])
+                ids.reverse()
+        return ids
+
+    # ---- модели ----
+
+    def users(self, count):
+        prefix = f'seed{self.seed}_'
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise ValueError(f'Пользователи с префиксом {prefix} уже есть: укажите другой --seed')
+        password = make_password(SEED_PASSWORD)
+        joined = [self._past() for _ in range(count)]
+        user_ids = self._bulk(User, (
+            User(
+                username=f'{prefix}{i:07d}',
+                email=f'{prefix}{i:07d}@example.com',
+                first_name=self.rng.choice(_FIRST_NAMES),
+                last_name=self.rng.choice(_LAST_NAMES),
+                password=password,
+                date_joined=joined[i],
+            )
+            for i in range(count)
+        ))
+        # bulk_create не вызывает post_save, профили создаем сами
+        self._bulk(UserProfile, (
+            UserProfile(
+                user_id=user_id,
+                phone=f'+7 9{self.rng.randrange(10 ** 9):09d}',
+                address=f'г. Москва, ул. Садовая, д. {self.rng.randint(1, 200)}',
+                created_at=joined[i],
+            )
+            for i, user_id in enumerate(user_ids)
+        ))
+        return user_ids
+
+    def _product(self, i):
+        created = self._past()
+        description = ' '.join(self.rng.sample(_SENTENCES, self.rng.randint(1, 3)))
+        # Цены логнормальные: много недорогих сувениров и хвост дорогих наборов
+        price = min(max(round(math.exp(self.rng.gauss(6.8, 0.9)), -1), 50), 99990)
+        return Product(
+            sku=f'SEED{self.seed}-{i:07d}',
+            name=f'{self.rng.choice(_ADJECTIVES)} {self.rng.choice(_NOUNS)} «{self.rng.choice(_THEMES)}» №{i}',
+            description=description,
+            price=Decimal(price).quantize(Decimal('0.01')),
+            category=self.category_sampler.one(),
+            created_at=created,
+            updated_at=self._between(created),
+        )
+
+    def products(self, count):
+        self.category_sampler = self._zipf(_CATEGORIES)
+        return self._bulk(Product, (self._product(i) for i in range(count)))
+
+    def articles(self, count):
+        published = []
+
+        def make(i):
+            date = self._past()
+            published.append(date)
+            paragraphs = [
+                ' '.join(self.rng.choices(_SENTENCES, k=self.rng.randint(3, 6)))
+                for _ in range(self.rng.randint(4, 12))
+            ]
+            return BlogArticle(
+                title=f'{self.rng.choice(_ARTICLE_TOPICS)}: {self.rng.choice(_THEMES)} (№{i})',
+                short_content=paragraphs[0][:500],
+                full_content='\n\n'.join(paragraphs),
+                published_date=date,
+                created_at=date,
+                updated_at=self._between(date),
+            )
+
+        ids = self._bulk(BlogArticle, (make(i) for i in range(count)))
+        return list(zip(ids, published))
+
+    def comments(self, count, articles, user_ids):
+        if not articles or not user_ids:
+            return []
+        published = dict(articles)
+        article_sampler = self._zipf(published)
+        author_sampler = self._zipf(user_ids)
+
+        def make():
+            article_id = article_sampler.one()
+            return Comment(
+                post_id=article_id,
+                author_id=author_sampler.one(),
+                text=self.rng.choice(_COMMENTS),
+                created_date=self._between(published[article_id]),
+                approved_comment=self.rng.random() < 0.95,
+            )
+
+        return self._bulk(Comment, (make() for _ in range(count)))
+
+    def feedback(self, count, user_ids):
+        features = [code for code, _ in LIKED_FEATURE_CHOICES]
+        visits = [code for code, _ in FeedbackForm.VISIT_FREQUENCY]
+        ratings = [rating for rating, _, _ in _RATINGS]
+        weights = [weight for _, weight, _ in _RATINGS]
+        base_recommendation = {rating: base for rating, _, base in _RATINGS}
+        chosen_features = []
+
+        def make(i):
+            rating = self.rng.choices(ratings, weights)[0]
+            liked = self.rng.sample(features, self.rng.randint(0, 4))
+            chosen_features.append(liked)
+            user_id = self.rng.choice(user_ids) if user_ids and self.rng.random() < 0.6 else None
+            return Feedback(
+                user_id=user_id,
+                name=f'{self.rng.choice(_FIRST_NAMES)} {self.rng.choice(_LAST_NAMES)}',
+                email=f'feedback{self.seed}_{i}@example.com',
+                overall_rating=rating,
+                liked_features=', '.join(liked),
+                visit_frequency=self.rng.choices(visits, _VISIT_WEIGHTS)[0],
+                recommendation=min(10, max(0, round(self.rng.gauss(base_recommendation[rating], 1.2)))),
+                suggestions=self.rng.choice(['', '', '', 'Добавьте больше товаров', 'Сделайте доставку быстрее']),
+                agree_to_terms=True,
+                created_at=self._past(),
+            )
+
+        ids = self._bulk(Feedback, (make(i) for i in range(count)))
+        self._bulk(FeedbackFeature, (
+            FeedbackFeature(feedback_id=feedback_id, feature=code)
+            for feedback_id, liked in zip(ids, chosen_features)
+            for code in liked
+        ))
+        return ids
+
+    def carts(self, ratio, user_ids, product_ids):
+        if not user_ids or not product_ids:
+            return []
+        owners = self.rng.sample(user_ids, int(len(user_ids) * ratio))
+        created = [self._past(30) for _ in owners]
+        cart_ids = self._bulk(Cart, (
+            Cart(user_id=user_id, is_active=True, created_at=created[i])
+            for i, user_id in enumerate(owners)
+        ))
+        product_sampler = self._zipf(product_ids)
+        self._bulk(CartItem, (
+            CartItem(
+                cart_id=cart_id,
+                product_id=product_id,
+                quantity=self.rng.choices([1, 2, 3, 5], [70, 20, 8, 2])[0],
+                added_at=self._between(created[i]),
+            )
+            for i, cart_id in enumerate(cart_ids)
+            # Число позиций в корзине: чаще 1-3, изредка до 8
+            for product_id in product_sampler.distinct(min(8, 1 + int(self.rng.expovariate(0.6))))
+        ))
+        return cart_ids
+
+    # ---- запуск ----
+
+    def run(self, users, products, articles, comments, feedback, cart_ratio=SEED_CART_RATIO):
+        with manual_timestamps(User, UserProfile, Product, BlogArticle, Feedback, Cart, CartItem):
+            user_ids = self.users(users)
+            product_ids = self.products(products)
+            article_dates = self.articles(articles)
+            self.comments(comments, article_dates, user_ids)
+            self.feedback(feedback, user_ids)
+            self.carts(cart_ratio, user_ids, product_ids)
+        self.finish()
+        return self.rows
+
+    def finish(self):
+        """Пересчитать то, что обычно поддерживают сигналы"""
+        FeedbackStats.recalculate()
+        for search_index in SEARCH_INDEXES.values():
+            search_index.rebuild()
+        bump_generation('products', 'articles', 'comments')
+        product_index.reset()
@@ -0,0 +1,154 @@
+# app/tasks.py
+"""
+Простая очередь фоновых задач на таблице Task.
+
+Функции регистрируются декоратором @task('имя'), а ставятся в очередь через
+enqueue('имя', key=..., **параметры) в той же транзакции, что и изменения
+данных. Задачи выполняет команда manage.py run_worker в пуле процессов;
+упавшая задача повторяется с экспоненциальной задержкой, пока не исчерпает
+max_attempts.
+
+Модуль не импортирует модели при загрузке: он же служит точкой входа для
+дочерних процессов пула, которые поднимают Django сами (см. worker_init).
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Задержка перед повтором: RETRY_BACKOFF * 2 ** (попытка - 1) секунд
+RETRY_BACKOFF = 30
+DEFAULT_MAX_ATTEMPTS = 3
+
+_registry = {}
+
+
+def task(name, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Зарегистрировать функцию как фоновую задачу"""
+    def decorator(func):
+        _registry[name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def get_task(name):
+    return _registry[name][0]
+
+
+def _task_model():
+    return apps.get_model('app', 'Task')
+
+
+def _run_eagerly():
+    # Для разработки без запущенного обработчика: выполнять задачу сразу
+    return getattr(settings, 'TASKS_ALWAYS_EAGER', False)
+
+
+def enqueue(name, key='', delay=0, **payload):
+    """
+    Поставить задачу в очередь. Если задача с таким же key уже ждет
+    выполнения, новая не создается и возвращается существующая.
+    """
+    if name not in _registry:
+        raise KeyError(f'Неизвестная задача: {name}')
+    if _run_eagerly():
+        transaction.on_commit(lambda: get_task(name)(**payload))
+        return None
+
+    Task = _task_model()
+    if key:
+        existing = Task.objects.filter(key=key, status=Task.PENDING).first()
+        if existing is not None:
+            return existing
+    return Task.objects.create(
+        name=name,
+        key=key,
+        payload=payload,
+        max_attempts=_registry[name][1],
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim_tasks(limit):
+    """
+    Забрать до limit готовых к выполнению задач и пометить их как running.
+    Каждая задача захватывается условным UPDATE, поэтому несколько
+    обработчиков не возьмут одну и ту же задачу дважды.
+    """
+    Task = _task_model()
+    now = timezone.now()
+    candidates = (
+        Task.objects.filter(status=Task.PENDING, run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    claimed = []
+    for task_id in candidates:
+        updated = Task.objects.filter(pk=task_id, status=Task.PENDING).update(
+            status=Task.RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(task_id)
+    return claimed
+
+
+def requeue_stale(timeout):
+    """Вернуть в очередь задачи, зависшие в running дольше timeout секунд"""
+    Task = _task_model()
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Task.objects.filter(status=Task.RUNNING, locked_at__lt=cutoff).update(
+        status=Task.PENDING, locked_at=None,
+    )
+
+
+def execute_task(task_id):
+    """Выполнить захваченную задачу и записать результат. Возвращает статус."""
+    Task = _task_model()
+    task_obj = Task.objects.get(pk=task_id)
+    entry = _registry.get(task_obj.name)
+    try:
+        if entry is None:
+            raise KeyError(f'Неизвестная задача: {task_obj.name}')
+        entry[0](**task_obj.payload)
+    except Exception:
+        task_obj.last_error = traceback.format_exc()
+        task_obj.locked_at = None
+        if entry is not None and task_obj.attempts < task_obj.max_attempts:
+            task_obj.status = Task.PENDING
+            task_obj.run_after = timezone.now() + timedelta(
+                seconds=RETRY_BACKOFF * 2 ** (task_obj.attempts - 1)
+            )
+        else:
+            task_obj.status = Task.FAILED
+            task_obj.finished_at = timezone.now()
+        logger.warning('Задача %s #%s упала (попытка %s)', task_obj.name, task_obj.pk, task_obj.attempts,
+                       exc_info=True)
+    else:
+        task_obj.status = Task.DONE
+        task_obj.last_error = ''
+        task_obj.finished_at = timezone.now()
+    task_obj.save(update_fields=['status', 'last_error', 'locked_at', 'run_after', 'finished_at'])
+    return task_obj.status
+
+
+def run_pending(limit=100):
+    """Выполнить готовые задачи в текущем процессе (для тестов и отладки)"""
+    return [execute_task(task_id) for task_id in claim_tasks(limit)]
+
+
+def worker_init():
+    """
+    Инициализатор процессов пула. При запуске через spawn поднимает Django,
+    при fork закрывает унаследованные от родителя соединения с БД.
+    """
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
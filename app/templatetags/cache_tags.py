@@ -0,0 +1,56 @@
+# app/templatetags/cache_tags.py
+"""Кэширование фрагментов шаблона по объекту (см. app/caching.py)"""
+from django import template
+
+from ..caching import UNCACHEABLE, get_fragment, set_fragment
+
+register = template.Library()
+
+
+class CacheObjectNode(template.Node):
+    def __init__(self, nodelist, obj, name):
+        self.nodelist = nodelist
+        self.obj = obj
+        self.name = name
+
+    def render(self, context):
+        obj = self.obj.resolve(context)
+        name = self.name.resolve(context)
+        if getattr(obj, 'pk', None) is None:
+            return self.nodelist.render(context)
+
+        value = get_fragment(obj, name)
+        if value is not None:
+            return value
+
+        render_context = context.render_context
+        outer = render_context.get(UNCACHEABLE)
+        render_context[UNCACHEABLE] = False
+        try:
+            value = self.nodelist.render(context)
+            uncacheable = render_context[UNCACHEABLE]
+        finally:
+            if outer is None:
+                del render_context[UNCACHEABLE]
+        if outer is not None:
+            # Вложенный некэшируемый фрагмент делает некэшируемым и внешний
+            render_context[UNCACHEABLE] = outer or uncacheable
+        if not uncacheable:
+            set_fragment(obj, name, value)
+        return value
+
+
+@register.tag
+def cache_object(parser, token):
+    """
+    {% cache_object объект "имя" %} ... {% endcache_object %}
+
+    Кэширует содержимое по id и updated_at объекта. Внутри не должно быть
+    ничего, что зависит от посетителя (CSRF-токен, кнопки персонала).
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' принимает объект и имя фрагмента")
+    nodelist = parser.parse(('endcache_object',))
+    parser.delete_first_token()
+    return CacheObjectNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -0,0 +1,46 @@
+# app/templatetags/image_tags.py
+"""Вывод изображений товаров и статей с адаптивными вариантами"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..caching import mark_uncacheable
+from ..images import IMAGE_PRESETS, VARIANT_FORMATS, get_variants, schedule_variants_once, srcset
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def responsive_image(context, field_file, preset, alt='', css_class='', style='', loading='lazy'):
+    """
+    <picture> с вариантами WebP/JPEG для пресета из images.IMAGE_PRESETS.
+
+    Пример: {% responsive_image product.image "product_card" alt=product.name %}
+    Пока варианты не готовы (или их не удалось подготовить), выводится
+    обычный <img> с оригиналом, а подготовка ставится в очередь; такой
+    вывод не попадает в кэш фрагментов ({% cache_object %}).
+    """
+    if not field_file:
+        return ''
+    manifest = get_variants(field_file, preset, generate=False)
+    if manifest is None:
+        schedule_variants_once(field_file)
+        mark_uncacheable(context)
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="{}" decoding="async">',
+            field_file.url, alt, css_class, style, loading,
+        )
+
+    sizes = IMAGE_PRESETS[preset]['sizes']
+    *sources, (fallback_extension, _, _) = VARIANT_FORMATS
+    width, height, name = manifest['variants'][fallback_extension][-1]
+    source_tags = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((content_type, srcset(field_file, manifest, extension), sizes)
+         for extension, content_type, _ in sources),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'alt="{}" class="{}" style="{}" loading="{}" decoding="async"></picture>',
+        source_tags, field_file.storage.url(name), srcset(field_file, manifest, fallback_extension),
+        sizes, width, height, alt, css_class, style, loading,
+    )
@@ -1,6 +1,1452 @@
-from django.test import TestCase
+import argparse
+import csv
+import io
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db.models import Count
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from AvecPlaisirShop.sqlite_backend.base import DatabaseWrapper as TunedSQLiteWrapper
+
+from .api import API_PAGE_SIZE
+from .autocomplete import ProductPrefixIndex, product_index
+from .blog_admin import blog_admin_site
+from .caching import bump_generation, fragment_key, get_generations
+from .exports import FEEDBACK_EXPORT_FIELDS
+from .images import SCHEDULE_MARKER_TIMEOUT, content_hash, get_variants
+from .middleware import AnonymousPageCacheMiddleware
+from .management.commands.bench_shop import (
+    BENCH_PASSWORD, cleanup_bench_data, ensure_bench_users, parse_mix, sample_rows, summarize,
+)
+from .models import (
+    BlogArticle, Cart, CartItem, Comment, Feedback, FeedbackFeature, FeedbackStats, Product, Task, UserProfile,
+)
+from .pagination import keyset_paginate
+from .profiling import QueryBudgetExceeded
+from .routers import PIN_SESSION_KEY, ReplicaRouter, replica_reads
+from .search import SEARCH_INDEXES, FullTextSearchAdminMixin
+from .seeding import ScaleSeeder, ZipfSampler
+from .tasks import claim_tasks, enqueue, requeue_stale, run_pending, task
+from .views import BLOG_PAGE_SIZE, CATALOG_PAGE_SIZE, COMMENTS_PAGE_SIZE, FEEDBACK_PAGE_SIZE
+
+# Тесты представлений идут мимо кэша страниц для анонимов: внутри TestCase
+# транзакции не коммитятся и сброс кэша по on_commit не срабатывает.
+# Сам кэш проверяется в PageCacheTest.
+NO_PAGE_CACHE = override_settings(ANONYMOUS_PAGE_CACHE_VIEWS={})
+
 
 class SimpleTest(TestCase):
     def test_homepage(self):
         response = self.client.get('/')
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+
+@NO_PAGE_CACHE
+class CatalogPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(name=f'Товар {i:03d}', price=100 + i, category='кружки' if i % 2 else 'сумки')
+            for i in range(60)
+        ])
+
+    def test_first_page_is_bounded(self):
+        response = self.client.get(reverse('catalog'))
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page']
+        self.assertEqual(len(page), CATALOG_PAGE_SIZE)
+        self.assertTrue(page.has_next)
+        self.assertEqual(page.object_list[0].name, 'Товар 000')
+
+    def test_walk_all_pages_forward_and_back(self):
+        seen = []
+        after = None
+        while True:
+            params = {'after': after} if after else {}
+            page = self.client.get(reverse('catalog'), params).context['page']
+            seen.extend(p.name for p in page)
+            if not page.has_next:
+                break
+            after = page.next_cursor
+        self.assertEqual(seen, sorted(Product.objects.values_list('name', flat=True)))
+
+        previous = self.client.get(reverse('catalog'), {'before': page.previous_cursor}).context['page']
+        self.assertEqual(previous.object_list[-1].name, seen[-len(page) - 1])
+
+    def test_category_filter(self):
+        page = self.client.get(reverse('catalog'), {'category': 'кружки'}).context['page']
+        self.assertTrue(all(p.category == 'кружки' for p in page))
+
+    def test_categories_are_cached_until_products_change(self):
+        caches['shared'].clear()
+        self.client.get(reverse('catalog'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('catalog'))
+        self.assertEqual([q['sql'] for q in queries if 'DISTINCT' in q['sql']], [])
+        self.assertEqual(response.context['categories'], ['кружки', 'сумки'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Фляжка', price=1, category='фляжки')
+        response = self.client.get(reverse('catalog'))
+        self.assertEqual(response.context['categories'], ['кружки', 'сумки', 'фляжки'])
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('catalog'), {'after': '%%%'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page'].object_list[0].name, 'Товар 000')
+
+
+class CartTotalsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pass12345')
+        cls.cart = Cart.objects.create(user=cls.user)
+        products = Product.objects.bulk_create([
+            Product(name=f'Товар {i}', price=Decimal('10.50') + i) for i in range(5)
+        ])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cls.cart, product=product, quantity=i + 1)
+            for i, product in enumerate(products)
+        ])
+
+    def test_totals_in_one_query(self):
+        with self.assertNumQueries(1):
+            totals = self.cart.totals()
+        expected = sum((Decimal('10.50') + i) * (i + 1) for i in range(5))
+        self.assertEqual(totals['total_price'], expected)
+        self.assertEqual(totals['items_count'], 5)
+        self.assertEqual(totals['total_quantity'], 15)
+
+    def test_empty_cart_totals(self):
+        cart = Cart.objects.create(user=User.objects.create_user('empty', password='pass12345'))
+        self.assertEqual(cart.totals(), {'total_price': 0, 'items_count': 0, 'total_quantity': 0})
+
+    def test_view_cart_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('view_cart'))
+        more = Product.objects.bulk_create([Product(name=f'Еще {i}', price=1) for i in range(30)])
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, product=p) for p in more])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('view_cart'))
+        self.assertEqual(response.context['items_count'], 35)
+        self.assertEqual(len(small), len(large))
+
+
+class AddToCartTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clicker', 'clicker@example.com', 'pass12345')
+        cls.product = Product.objects.create(name='Кружка', price=500)
+
+    def test_repeated_add_increments_quantity(self):
+        self.client.force_login(self.user)
+        for _ in range(3):
+            self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        item = CartItem.objects.get(cart__user=self.user)
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(Cart.objects.filter(user=self.user, is_active=True).count(), 1)
+
+    def test_existing_item_is_one_update(self):
+        self.assertTrue(CartItem.objects.add_for_user(self.user, self.product.id))
+        with self.assertNumQueries(1):
+            self.assertFalse(CartItem.objects.add_for_user(self.user, self.product.id))
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+
+    def test_increment_without_update_returning(self):
+        # Например MariaDB: INSERT ... RETURNING есть, UPDATE ... RETURNING нет
+        CartItem.objects.add_for_user(self.user, self.product.id)
+        with mock.patch.object(connection, 'vendor', 'mysql'), \
+                CaptureQueriesContext(connection) as queries:
+            self.assertEqual(CartItem.objects.increment_for_user(self.user, self.product.id), 'Кружка')
+        self.assertFalse([q for q in queries.captured_queries if 'RETURNING' in q['sql']])
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+
+    def test_view_common_path_is_one_statement(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        shop_queries = [q['sql'] for q in queries if 'app_cartitem' in q['sql'] or 'app_product' in q['sql']]
+        # Название товара для сообщения приходит из RETURNING того же UPDATE
+        self.assertEqual(len(shop_queries), 1)
+        self.assertIn('RETURNING', shop_queries[0])
+        self.assertEqual(
+            str(list(get_messages(response.wsgi_request))[-1]),
+            'Количество товара "Кружка" увеличено в корзине',
+        )
+
+    def test_single_active_cart_per_user(self):
+        Cart.objects.create(user=self.user)
+        Cart.objects.create(user=self.user, is_active=False)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+
+    def test_unknown_product_is_404(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('add_to_cart', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CartBadgeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('badge', 'badge@example.com', 'pass12345')
+        cls.product = Product.objects.create(name='Фляжка', price=2000)
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.client.force_login(self.user)
+
+    def cart_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q['sql'] for q in queries if 'app_cart' in q['sql']]
+
+    def test_badge_is_served_from_cache(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        response, first = self.cart_queries(reverse('about'))
+        self.assertEqual(response.context['cart_items_count'], 1)
+        self.assertEqual(len(first), 1)
+        response, second = self.cart_queries(reverse('about'))
+        self.assertEqual(second, [])
+        self.assertContains(response, '<span class="badge">1</span>', html=True)
+
+    def test_mutations_invalidate_badge(self):
+        self.client.get(reverse('about'))
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        self.assertEqual(self.client.get(reverse('about')).context['cart_items_count'], 1)
+        self.client.get(reverse('clear_cart'))
+        self.assertEqual(self.client.get(reverse('about')).context['cart_items_count'], 0)
+
+
+@NO_PAGE_CACHE
+class BlogListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('reader', password='pass12345')
+        now = timezone.now()
+        cls.articles = [
+            BlogArticle.objects.create(
+                title=f'Статья {i}', short_content='Кратко', full_content='Текст ' * 1000,
+                published_date=now - timedelta(days=i),
+            )
+            for i in range(BLOG_PAGE_SIZE + 3)
+        ]
+        Comment.objects.bulk_create([
+            Comment(post=cls.articles[0], author=cls.author, text='Отлично'),
+            Comment(post=cls.articles[0], author=cls.author, text='Супер'),
+            Comment(post=cls.articles[0], author=cls.author, text='Скрыт', approved_comment=False),
+        ])
+
+    def test_page_annotates_counts_and_defers_full_content(self):
+        response = self.client.get(reverse('blog_list'))
+        page = response.context['page']
+        self.assertEqual(len(page), BLOG_PAGE_SIZE)
+        self.assertTrue(page.has_next)
+        first = page.object_list[0]
+        self.assertEqual(first.pk, self.articles[0].pk)
+        self.assertEqual(first.comments_count, 2)
+        self.assertIn('full_content', first.get_deferred_fields())
+
+    def test_second_page(self):
+        page = self.client.get(reverse('blog_list')).context['page']
+        second = self.client.get(reverse('blog_list'), {'after': page.next_cursor}).context['page']
+        self.assertEqual([a.pk for a in second], [a.pk for a in self.articles[BLOG_PAGE_SIZE:]])
+        self.assertFalse(second.has_next)
+
+    def test_datetime_cursor_walk_forward_and_back(self):
+        BlogArticle.objects.all().delete()
+        base = timezone.now()
+        # Шаг 10 мс и пачка строк в одной миллисекунде: курсор с временем,
+        # обрезанным до миллисекунд, терял бы или повторял строки
+        dates = [base - timedelta(milliseconds=10 * i) for i in range(4)]
+        dates += [base - timedelta(milliseconds=50, microseconds=i) for i in range(5)]
+        articles = [
+            BlogArticle.objects.create(title=f'n{i}', short_content='-', full_content='-', published_date=date)
+            for i, date in enumerate(dates)
+        ]
+        expected = [a.pk for a in sorted(articles, key=lambda a: (a.published_date, a.pk), reverse=True)]
+
+        queryset = BlogArticle.objects.all()
+        fields = ('-published_date', '-id')
+        pages = [keyset_paginate(queryset, fields, per_page=2)]
+        while pages[-1].has_next:
+            pages.append(keyset_paginate(queryset, fields, after=pages[-1].next_cursor, per_page=2))
+        self.assertEqual([a.pk for page in pages for a in page], expected)
+        for previous, page in zip(pages, pages[1:]):
+            back = keyset_paginate(queryset, fields, before=page.previous_cursor, per_page=2)
+            self.assertEqual([a.pk for a in back], [a.pk for a in previous])
+
+    def test_query_count_does_not_depend_on_comments(self):
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse('blog_list'))
+        Comment.objects.bulk_create([
+            Comment(post=article, author=self.author, text='Еще') for article in self.articles
+        ])
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(reverse('blog_list'))
+        self.assertEqual(len(before), len(after))
+
+
+class ArticleCommentsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.article = BlogArticle.objects.create(title='Вирусная статья', short_content='Кратко', full_content='Текст')
+        cls.authors = [User.objects.create_user(f'user{i}', password='pass12345') for i in range(5)]
+        now = timezone.now()
+        Comment.objects.bulk_create([
+            Comment(post=cls.article, author=cls.authors[i % 5], text=f'Комментарий {i}',
+                    created_date=now - timedelta(minutes=i))
+            for i in range(COMMENTS_PAGE_SIZE + 5)
+        ])
+
+    def test_first_page_with_authors_in_one_query(self):
+        url = reverse('blog_article_detail', args=[self.article.id])
+        response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PAGE_SIZE)
+        self.assertEqual(response.context['comments_count'], COMMENTS_PAGE_SIZE + 5)
+        with self.assertNumQueries(0):
+            [comment.author.username for comment in comments]
+        self.assertContains(response, 'id="load-more-comments"')
+
+    def test_load_more_json(self):
+        first = self.client.get(reverse('blog_article_detail', args=[self.article.id])).context['comments']
+        response = self.client.get(
+            reverse('blog_article_comments', args=[self.article.id]), {'after': first.next_cursor}
+        )
+        data = response.json()
+        self.assertEqual([c['text'] for c in data['comments']],
+                         [f'Комментарий {i}' for i in range(COMMENTS_PAGE_SIZE, COMMENTS_PAGE_SIZE + 5)])
+        self.assertIn('Комментарий 24', data['html'])
+        self.assertIsNone(data['next'])
+
+    def test_load_more_keeps_comments_in_same_millisecond(self):
+        article = BlogArticle.objects.create(title='Обсуждение', short_content='Кратко', full_content='Текст')
+        moment = timezone.now()
+        Comment.objects.bulk_create([
+            Comment(post=article, author=self.authors[0], text=f'Пачка {i}',
+                    created_date=moment + timedelta(microseconds=i))
+            for i in range(COMMENTS_PAGE_SIZE + 5)
+        ])
+        first = self.client.get(reverse('blog_article_detail', args=[article.id])).context['comments']
+        data = self.client.get(
+            reverse('blog_article_comments', args=[article.id]), {'after': first.next_cursor}
+        ).json()
+        shown = [c.text for c in first] + [c['text'] for c in data['comments']]
+        self.assertEqual(shown, [f'Пачка {i}' for i in reversed(range(COMMENTS_PAGE_SIZE + 5))])
+
+    def test_load_more_unknown_article(self):
+        response = self.client.get(reverse('blog_article_comments', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+
+def make_feedback(**kwargs):
+    values = {
+        'name': 'Гость', 'email': 'guest@example.com', 'overall_rating': '5',
+        'visit_frequency': 'first', 'recommendation': 10, 'agree_to_terms': True,
+    }
+    values.update(kwargs)
+    return Feedback.objects.create(**values)
+
+
+class FeedbackStatsTest(TestCase):
+    def assertStatsConsistent(self):
+        maintained = FeedbackStats.get()
+        fields = [f.name for f in FeedbackStats._meta.fields if f.name != 'id']
+        expected = FeedbackStats.recalculate()
+        self.assertEqual(
+            {f: getattr(maintained, f) for f in fields},
+            {f: getattr(expected, f) for f in fields},
+        )
+        return expected
+
+    def test_create_update_delete(self):
+        make_feedback(recommendation=10, overall_rating='5')
+        make_feedback(recommendation=3, overall_rating='2')
+        changed = make_feedback(recommendation=8, overall_rating='4')
+        stats = self.assertStatsConsistent()
+        self.assertEqual((stats.total_count, stats.promoters, stats.passives, stats.detractors), (3, 1, 1, 1))
+        self.assertEqual(stats.average_recommendation, 7.0)
+        self.assertEqual(stats.nps, 0)
+
+        changed = Feedback.objects.get(pk=changed.pk)
+        changed.recommendation = 2
+        changed.overall_rating = '1'
+        changed.save()
+        stats = self.assertStatsConsistent()
+        self.assertEqual((stats.detractors, stats.rating_1, stats.rating_4), (2, 1, 0))
+
+        Feedback.objects.filter(recommendation__lt=5).delete()
+        stats = self.assertStatsConsistent()
+        self.assertEqual(stats.total_count, 1)
+
+    def test_delete_feedback_view_updates_stats(self):
+        feedback = make_feedback()
+        staff = User.objects.create_user('staff', password='pass12345', is_staff=True)
+        self.client.force_login(staff)
+        self.client.post(reverse('delete_feedback', args=[feedback.id]))
+        self.assertEqual(FeedbackStats.get().total_count, 0)
+
+    def test_feedback_list_is_paginated_and_uses_stats(self):
+        for i in range(FEEDBACK_PAGE_SIZE + 1):
+            make_feedback(recommendation=i % 11)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('feedback_list'))
+        self.assertEqual(len(response.context['feedbacks']), FEEDBACK_PAGE_SIZE)
+        self.assertEqual(response.context['total_feedbacks'], FEEDBACK_PAGE_SIZE + 1)
+        self.assertFalse(any('AVG' in q['sql'].upper() for q in queries))
+
+    def test_feedback_list_walk_back(self):
+        # created_at (auto_now_add) у отзывов, созданных подряд, часто в одной миллисекунде
+        for i in range(FEEDBACK_PAGE_SIZE * 2 + 3):
+            make_feedback(name=f'Гость {i}')
+        url = reverse('feedback_list')
+        pages = [self.client.get(url).context['page']]
+        while pages[-1].has_next:
+            pages.append(self.client.get(url, {'after': pages[-1].next_cursor}).context['page'])
+        self.assertEqual(
+            [f.pk for page in pages for f in page],
+            list(Feedback.objects.order_by('-created_at', '-id').values_list('pk', flat=True)),
+        )
+        for previous, page in zip(pages, pages[1:]):
+            back = self.client.get(url, {'before': page.previous_cursor}).context['page']
+            self.assertEqual([f.pk for f in back], [f.pk for f in previous])
+
+
+class FeedbackExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('analyst', password='pass12345', is_staff=True)
+        cls.old = make_feedback(name='Старый')
+        Feedback.objects.filter(pk=cls.old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        cls.new = make_feedback(name='Новый, с запятой', suggestions='строка 1\nстрока 2')
+
+    def test_requires_staff(self):
+        self.client.force_login(User.objects.create_user('plain', password='pass12345'))
+        response = self.client.get(reverse('export_feedback'))
+        self.assertRedirects(response, reverse('feedback_list'))
+
+    def test_streaming_csv(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_feedback'))
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(rows[0], FEEDBACK_EXPORT_FIELDS)
+        self.assertEqual([row[2] for row in rows[1:]], ['Старый', 'Новый, с запятой'])
+
+    def test_ndjson_with_date_range(self):
+        self.client.force_login(self.staff)
+        today = timezone.localdate().isoformat()
+        response = self.client.get(reverse('export_feedback'), {'format': 'ndjson', 'date_from': today})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], ['Новый, с запятой'])
+
+    def test_bad_date_is_400(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_feedback'), {'date_to': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('export_feedback', '--format', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class FeedbackFeatureTest(TestCase):
+    def test_feedback_form_stores_features(self):
+        user = User.objects.create_user('critic', 'critic@example.com', 'pass12345')
+        self.client.force_login(user)
+        self.client.post(reverse('feedback'), {
+            'name': 'Критик', 'email': 'critic@example.com', 'overall_rating': '4',
+            'liked_features': ['delivery', 'prices'], 'visit_frequency': 'weekly',
+            'recommendation': 9, 'agree_to_terms': 'on',
+        })
+        feedback = Feedback.objects.get()
+        self.assertEqual(feedback.liked_features, 'delivery, prices')
+        self.assertEqual(sorted(feedback.features.values_list('feature', flat=True)), ['delivery', 'prices'])
+
+    def test_counts_in_one_grouped_query(self):
+        make_feedback().set_liked_features(['design', 'delivery'])
+        make_feedback().set_liked_features(['delivery'])
+        make_feedback().set_liked_features(['delivery', 'unknown'])
+        with self.assertNumQueries(1):
+            counts = FeedbackFeature.objects.counts()
+        self.assertEqual(counts, {
+            'design': 1, 'navigation': 0, 'products': 0, 'prices': 0, 'delivery': 3, 'support': 0,
+        })
+        self.assertEqual(Feedback.objects.filter(features__feature='delivery').count(), 3)
+
+    def test_resetting_features_replaces_rows(self):
+        feedback = make_feedback()
+        feedback.set_liked_features(['design', 'support'])
+        feedback.set_liked_features(['navigation'])
+        self.assertEqual(list(feedback.features.values_list('feature', flat=True)), ['navigation'])
+        self.assertEqual(Feedback.objects.get(pk=feedback.pk).liked_features, 'navigation')
+
+
+class MyFeedbacksTest(TestCase):
+    def test_history_follows_user_not_email(self):
+        user = User.objects.create_user('owner', 'old@example.com', 'pass12345')
+        self.client.force_login(user)
+        self.client.post(reverse('feedback'), {
+            'name': 'Владелец', 'email': 'old@example.com', 'overall_rating': '5',
+            'visit_frequency': 'daily', 'recommendation': 10, 'agree_to_terms': 'on',
+        })
+        make_feedback(email='old@example.com', name='Чужой')
+        user.email = 'new@example.com'
+        user.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('my_feedbacks'))
+        self.assertEqual(response.context['total_feedbacks'], 1)
+        self.assertEqual(response.context['feedbacks'][0].name, 'Владелец')
+        self.assertEqual(sum('"app_feedback"' in q['sql'] for q in queries), 1)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.mug = Product.objects.create(name='Кружка Avec Plaisir', description='Керамическая кружка, 350 мл', price=500)
+        Product.objects.create(name='Экосумка', description='Хлопковая сумка с принтом', price=1000)
+        cls.article = BlogArticle.objects.create(
+            title='Как выбрать подарок', short_content='Советы', full_content='Керамика <b>всегда</b> уместна',
+        )
+
+    def test_ranked_results_with_snippets(self):
+        response = self.client.get(reverse('search'), {'q': 'керамич'})
+        self.assertEqual([p.pk for p in response.context['products']], [self.mug.pk])
+        self.assertIn('<mark>Керамическая</mark>', response.context['products'][0].search_snippet)
+        self.assertEqual(response.context['articles'], [])
+
+    def test_snippet_is_escaped(self):
+        article = SEARCH_INDEXES['article'].search('керамика')[0]
+        self.assertIn('&lt;b&gt;', article.search_snippet)
+
+    def test_index_follows_save_and_delete(self):
+        self.mug.name = 'Чашка'
+        self.mug.save()
+        self.assertEqual(SEARCH_INDEXES['product'].search_ids('чашка'), [self.mug.pk])
+        self.assertEqual(SEARCH_INDEXES['product'].search_ids('plaisir'), [])
+        self.mug.delete()
+        self.assertEqual(SEARCH_INDEXES['product'].search_ids('чашка'), [])
+
+    def test_fts_syntax_in_query_is_harmless(self):
+        response = self.client.get(reverse('search'), {'q': 'сумка")*:^'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 1)
+
+    def test_admin_search_uses_index(self):
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pass12345')
+        self.client.force_login(admin_user)
+        response = self.client.get('/blog-admin/app/blogarticle/', {'q': 'подарок'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.article])
+
+    def test_admin_search_over_limit_falls_back(self):
+        BlogArticle.objects.create(title='Новогодний подарок коллегам', short_content='Идеи', full_content='Текст')
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pass12345')
+        self.client.force_login(admin_user)
+        with mock.patch.object(FullTextSearchAdminMixin, 'search_results_limit', 1):
+            response = self.client.get('/blog-admin/app/blogarticle/', {'q': 'подарок'})
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+        warnings = [str(m) for m in get_messages(response.wsgi_request) if m.level_tag == 'warning']
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('больше 1 совпадений', warnings[0])
+
+
+class AutocompleteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.flask = Product.objects.create(name='Стальная фляжка', price=2000)
+        cls.mug = Product.objects.create(name='Кружка Avec Plaisir', price=500)
+        Product.objects.create(name='Ёлочная игрушка', price=300)
+
+    def setUp(self):
+        product_index.reset()
+
+    def names(self, query, limit=8):
+        return [row[1] for row in product_index.lookup(query, limit)]
+
+    def test_prefix_of_name_and_of_words(self):
+        self.assertEqual(self.names('кру'), ['Кружка Avec Plaisir'])
+        self.assertEqual(self.names('фляж'), ['Стальная фляжка'])
+        self.assertEqual(self.names('PLAI'), ['Кружка Avec Plaisir'])
+        self.assertEqual(self.names('елоч'), ['Ёлочная игрушка'])
+        self.assertEqual(self.names(''), [])
+
+    def test_no_queries_after_lazy_load(self):
+        product_index.lookup('к')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('catalog_autocomplete'), {'q': 'ст', 'limit': 1})
+        self.assertEqual(response.json()['results'][0]['name'], 'Стальная фляжка')
+
+    def test_concurrent_lookups_load_once(self):
+        index = ProductPrefixIndex(max_age=300)
+        loads = []
+
+        def slow_load():
+            loads.append(threading.get_ident())
+            time.sleep(0.05)
+            index._loaded_at = time.monotonic()
+
+        with mock.patch.object(index, 'load', side_effect=slow_load):
+            threads = [threading.Thread(target=index.lookup, args=('к',)) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(loads), 1)
+
+            # Устаревший индекс, который уже перезагружает другой поток: поиск не ждет
+            index._loaded_at -= 1000
+            with index._load_lock:
+                index.lookup('к')
+            self.assertEqual(len(loads), 1)
+            index.lookup('к')
+            self.assertEqual(len(loads), 2)
+
+    def test_signals_keep_index_current(self):
+        product_index.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mug.name = 'Чашка'
+            self.mug.save()
+            Product.objects.create(name='Кружево', price=100)
+            self.flask.delete()
+        self.assertEqual(self.names('кру'), ['Кружево'])
+        self.assertEqual(self.names('чаш'), ['Чашка'])
+        self.assertEqual(self.names('фля'), [])
+
+
+def make_image_file(name='photo.png', size=(1000, 500), color=(139, 0, 0)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@NO_PAGE_CACHE
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        cache.clear()
+        caches['shared'].clear()
+
+    def test_variants_are_generated_by_worker(self):
+        product = Product.objects.create(name='Кружка', price=100, image=make_image_file())
+        self.assertIsNone(get_variants(product.image, 'product_card', generate=False))
+        self.assertEqual(Task.objects.get().name, 'images.prepare_variants')
+
+        self.assertEqual(run_pending(), [Task.DONE])
+        manifest = get_variants(product.image, 'product_card', generate=False)
+        # Все три ширины пресета не больше ширины оригинала (1000px)
+        self.assertEqual([width for width, _, _ in manifest['variants']['webp']], [240, 480, 720])
+        self.assertEqual(manifest['variants']['jpeg'][0][:2], (240, 120))
+        for _, _, name in manifest['variants']['webp'] + manifest['variants']['jpeg']:
+            self.assertTrue(product.image.storage.exists(name))
+
+    def test_missing_variants_do_not_open_original(self):
+        product = Product.objects.create(name='Кружка', price=100, image=make_image_file())
+        with mock.patch('PIL.Image.open') as image_open:
+            self.assertIsNone(get_variants(product.image, 'product_card', generate=False))
+        image_open.assert_not_called()
+
+        # Варианты другого пресета уже есть: размеры читаются из заголовка без декодирования
+        get_variants(product.image, 'cart_thumb')
+        cache.clear()
+        caches['shared'].clear()
+        with mock.patch('PIL.ImageFile.ImageFile.load') as load:
+            self.assertIsNone(get_variants(product.image, 'product_card', generate=False))
+            self.assertIsNotNone(get_variants(product.image, 'cart_thumb', generate=False))
+        load.assert_not_called()
+
+    def test_missing_variants_are_not_rehashed(self):
+        product = Product.objects.create(name='Кружка', price=100, image=make_image_file())
+        with mock.patch('app.images.content_hash', wraps=content_hash) as hashed:
+            for _ in range(3):
+                self.assertIsNone(get_variants(product.image, 'product_card', generate=False))
+        self.assertEqual(hashed.call_count, 1)
+
+        # Обработчик (другой процесс со своим кэшем default) снимает отметку
+        self.assertEqual(run_pending(), [Task.DONE])
+        cache.clear()
+        self.assertIsNotNone(get_variants(product.image, 'product_card', generate=False))
+
+    def test_small_image_is_not_upscaled(self):
+        product = Product.objects.create(name='Значок', price=50, image=make_image_file(size=(200, 200)))
+        manifest = get_variants(product.image, 'product_card')
+        self.assertEqual(manifest['variants']['jpeg'], [(200, 200, manifest['variants']['jpeg'][0][2])])
+
+    def test_identical_content_shares_variants(self):
+        first = Product.objects.create(name='A', price=1, image=make_image_file('a.png'))
+        second = Product.objects.create(name='B', price=1, image=make_image_file('b.png'))
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            get_variants(first.image, 'cart_thumb'),
+            get_variants(second.image, 'cart_thumb'),
+        )
+
+    def test_template_tag_emits_srcset(self):
+        product = Product.objects.create(name='Кружка', price=100, image=make_image_file())
+        template = Template(
+            '{% load image_tags %}{% responsive_image product.image "product_card" alt=product.name %}'
+        )
+        # Пока обработчик не отработал, выводится оригинал
+        self.assertIn(f'src="{product.image.url}"', template.render(Context({'product': product})))
+        self.assertEqual(Task.objects.filter(status=Task.PENDING).count(), 1)
+
+        run_pending()
+        html = template.render(Context({'product': product}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('480w', html)
+        self.assertIn('alt="Кружка"', html)
+        self.assertNotIn(product.image.url, html)
+
+        response = self.client.get(reverse('catalog'))
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_broken_file_falls_back_to_original(self):
+        broken = SimpleUploadedFile('broken.png', b'not an image', content_type='image/png')
+        product = Product.objects.create(name='Битая', price=1, image=broken)
+        template = Template('{% load image_tags %}{% responsive_image product.image "cart_thumb" %}')
+        # Файл разбирает только обработчик, и ошибка пишется в лог там
+        with self.assertLogs('app.images', level='WARNING'):
+            run_pending()
+        html = template.render(Context({'product': product}))
+        self.assertIn(f'src="{product.image.url}"', html)
+        self.assertNotIn('<picture>', html)
+
+    def test_broken_file_is_not_rescheduled(self):
+        broken = SimpleUploadedFile('broken.png', b'not an image', content_type='image/png')
+        product = Product.objects.create(name='Битая', price=1, image=broken)
+        template = Template('{% load image_tags %}{% responsive_image product.image "cart_thumb" %}')
+        with self.assertLogs('app.images', level='WARNING'):
+            run_pending()
+        # Отметки рендера давно истекли бы, но неудачная обработка их продлила
+        later = time.time() + SCHEDULE_MARKER_TIMEOUT * 2
+        cache.clear()
+        with mock.patch('django.core.cache.backends.filebased.time.time', return_value=later), \
+                mock.patch('app.images.content_hash') as hashed:
+            template.render(Context({'product': product}))
+        hashed.assert_not_called()
+        self.assertFalse(Task.objects.filter(status=Task.PENDING).exists())
+
+
+@task('tests.flaky', max_attempts=2)
+def flaky_task(fail):
+    if fail:
+        raise RuntimeError('сбой')
+
+
+class TaskQueueTest(TestCase):
+    def test_key_deduplicates_pending_tasks(self):
+        first = enqueue('tests.flaky', key='k', fail=False)
+        self.assertEqual(enqueue('tests.flaky', key='k', fail=False), first)
+        enqueue('tests.flaky', fail=False)
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_retry_with_backoff_then_fail(self):
+        queued = enqueue('tests.flaky', fail=True)
+        with self.assertLogs('app.tasks', level='WARNING'):
+            self.assertEqual(run_pending(), [Task.PENDING])
+        queued.refresh_from_db()
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_after, timezone.now())
+        self.assertIn('RuntimeError', queued.last_error)
+        # До истечения задержки задача не выбирается
+        self.assertEqual(claim_tasks(10), [])
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('app.tasks', level='WARNING'):
+            self.assertEqual(run_pending(), [Task.FAILED])
+
+    def test_claim_is_exclusive_and_stale_tasks_return(self):
+        queued = enqueue('tests.flaky', fail=False)
+        self.assertEqual(claim_tasks(10), [queued.pk])
+        self.assertEqual(claim_tasks(10), [])
+
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(600), 1)
+        self.assertEqual(run_pending(), [Task.DONE])
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(KeyError):
+            enqueue('tests.missing')
+
+
+@NO_PAGE_CACHE
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pass')
+        self.product = Product.objects.create(name='Кружка', price=100)
+        self.article = BlogArticle.objects.create(title='Статья', short_content='Кратко', full_content='Текст')
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('ETag'))
+        return first['ETag'], self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code
+
+    def test_unchanged_pages_return_304(self):
+        for url in (reverse('catalog'), reverse('blog_list'),
+                    reverse('blog_article_detail', args=[self.article.id])):
+            with self.subTest(url=url):
+                _, status = self.revalidate(url)
+                self.assertEqual(status, 304)
+
+    def test_data_changes_invalidate_etag(self):
+        etag, _ = self.revalidate(reverse('catalog'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Фляжка', price=300)
+        self.assertEqual(self.client.get(reverse('catalog'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        url = reverse('blog_article_detail', args=[self.article.id])
+        etag, _ = self.revalidate(url)
+        Comment.objects.create(post=self.article, author=self.user, text='Новый комментарий')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Список блога: удаление комментария тоже меняет ETag (поколение темы comments)
+        etag, _ = self.revalidate(reverse('blog_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.get().delete()
+        self.assertEqual(self.client.get(reverse('blog_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_validators_skip_aggregates(self):
+        # Список блога считает ETag без SQL, а POST (комментарий) не считает его вовсе
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('blog_list'))
+            self.client.post(reverse('blog_article_detail', args=[self.article.id]), {'text': 'Отличная статья'})
+        self.assertEqual([q['sql'] for q in queries if 'MAX(' in q['sql']], [])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('catalog'))
+        self.assertEqual([q['sql'] for q in queries if 'MAX(' in q['sql']], [])
+
+    def test_etag_depends_on_visitor(self):
+        anonymous_etag, _ = self.revalidate(reverse('catalog'))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('catalog'), HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], anonymous_etag)
+
+    def test_no_etag_when_messages_pending(self):
+        self.client.force_login(self.user)
+        url = reverse('blog_article_detail', args=[self.article.id])
+        response = self.client.post(url, {'text': 'Отличная статья'}, follow=True)
+        self.assertContains(response, 'успешно добавлен')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertTrue(self.client.get(url).has_header('ETag'))
+
+
+@NO_PAGE_CACHE
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        self.fragments = caches['fragments']
+        self.fragments.clear()
+        self.product = Product.objects.create(name='Кружка', price=100, description='Фарфор')
+        self.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+
+    def test_card_is_served_from_cache(self):
+        self.client.get(reverse('catalog'))
+        key = fragment_key(self.product, 'card')
+        self.assertIn('Фарфор', self.fragments.get(key))
+
+        self.fragments.set(key, '<p>из кэша</p>')
+        self.assertContains(self.client.get(reverse('catalog')), 'из кэша')
+
+    def test_save_and_delete_invalidate(self):
+        self.client.get(reverse('catalog'))
+        old_key = fragment_key(self.product, 'card')
+        self.product.description = 'Керамика'
+        self.product.save()
+        self.assertNotEqual(fragment_key(self.product, 'card'), old_key)
+        self.assertContains(self.client.get(reverse('catalog')), 'Керамика')
+
+        # save(update_fields) не меняет updated_at, но запись все равно удаляется
+        self.product.price = 150
+        self.product.save(update_fields=['price'])
+        self.assertContains(self.client.get(reverse('catalog')), '150')
+
+        key = fragment_key(self.product, 'card')
+        self.product.delete()
+        self.assertIsNone(self.fragments.get(key))
+
+    def test_visitor_specific_parts_stay_outside(self):
+        self.client.get(reverse('catalog'))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('catalog'))
+        self.assertContains(response, reverse('edit_product', args=[self.product.id]))
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        fragment = self.fragments.get(fragment_key(self.product, 'card'))
+        self.assertNotIn('csrfmiddlewaretoken', fragment)
+        # Фрагмент - законченные элементы: открытые в нем теги в нем же закрыты
+        self.assertEqual(fragment.count('<div'), fragment.count('</div>'))
+
+    def test_article_body_is_cached(self):
+        article = BlogArticle.objects.create(title='Статья', short_content='Кратко', full_content='Полный текст')
+        self.client.get(reverse('blog_article_detail', args=[article.id]))
+        self.assertIn('Полный текст', self.fragments.get(fragment_key(article, 'body')))
+
+    def test_fallback_image_is_not_cached(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            Product.objects.create(name='С фото', price=1, image=make_image_file())
+            product = Product.objects.get(name='С фото')
+            self.client.get(reverse('catalog'))
+            self.assertIsNone(self.fragments.get(fragment_key(product, 'card')))
+            self.assertIn('Фарфор', self.fragments.get(fragment_key(self.product, 'card')))
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        caches['shared'].clear()
+        self.product = Product.objects.create(name='Кружка', price=100)
+        self.article = BlogArticle.objects.create(title='Статья', short_content='Кратко', full_content='Текст')
+        self.user = User.objects.create_user('reader', password='pass')
+
+    def get(self, name):
+        return self.client.get(reverse(name))
+
+    def test_anonymous_pages_are_cached(self):
+        self.assertEqual(self.get('catalog')['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.get('catalog')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Кружка')
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('catalog'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_disabled_with_process_local_cache(self):
+        local = {**settings.CACHES, 'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local), self.assertLogs('app.middleware', level='WARNING'):
+            with self.assertRaises(MiddlewareNotUsed):
+                AnonymousPageCacheMiddleware(lambda request: None)
+
+    def test_generations_shared_with_process_local_pages(self):
+        # Поколения (и ETag по ним) не должны жить в locmem-кэше отдельного воркера
+        local = {**settings.CACHES, 'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local):
+            generation, = get_generations(('products',))
+            bump_generation('products')
+            self.assertEqual(caches['shared'].get('page_generation:products'), generation + 1)
+            self.assertIsNone(caches['pages'].get('page_generation:products'))
+
+    def test_changes_invalidate_only_dependent_pages(self):
+        self.get('catalog')
+        self.get('blog_list')
+        self.get('about')
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.article, author=self.user, text='Комментарий')
+        self.assertEqual(self.get('blog_list')['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get('catalog')['X-Page-Cache'], 'hit')
+        self.assertEqual(self.get('about')['X-Page-Cache'], 'hit')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Чашка'
+            self.product.save()
+        response = self.get('catalog')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Чашка')
+
+    def test_admin_bulk_actions_invalidate(self):
+        comment = Comment.objects.create(post=self.article, author=self.user, text='Скрыть', approved_comment=True)
+        self.get('blog_list')
+        admin_user = User.objects.create_superuser('boss', password='pass')
+        self.client.force_login(admin_user)
+        self.client.post('/blog-admin/app/comment/', {
+            'action': 'disapprove_comments', '_selected_action': [comment.pk],
+        })
+        self.client.logout()
+        self.assertFalse(Comment.objects.get(pk=comment.pk).approved_comment)
+        self.assertEqual(self.get('blog_list')['X-Page-Cache'], 'miss')
+
+    def test_logged_in_and_messages_bypass_cache(self):
+        self.get('catalog')
+        self.client.force_login(self.user)
+        response = self.get('catalog')
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'reader')
+
+        self.client.logout()
+        self.client.cookies['messages'] = 'x'
+        self.assertFalse(self.get('catalog').has_header('X-Page-Cache'))
+
+    def test_pages_setting_cookies_are_not_cached(self):
+        # Форма обратной связи выставляет CSRF-cookie
+        self.get('contact')
+        self.assertFalse(self.get('contact').has_header('X-Page-Cache'))
+
+
+class ProductApiTest(TestCase):
+    def setUp(self):
+        Product.objects.bulk_create([
+            Product(name=f'Товар {i:03d}', price=Decimal('10.50') + i, description='Длинное описание',
+                    category='кружки' if i % 2 else 'сумки')
+            for i in range(API_PAGE_SIZE + 10)
+        ])
+
+    def get_json(self, params=None, url=None):
+        response = self.client.get(url or reverse('api_products'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_default_fields_and_cursor_walk(self):
+        first = self.get_json()
+        self.assertEqual(len(first['results']), API_PAGE_SIZE)
+        self.assertEqual(set(first['results'][0]), {'id', 'name', 'price', 'category', 'image'})
+        self.assertEqual(first['results'][0]['price'], '10.50')
+        self.assertIsNone(first['previous'])
+
+        second = self.get_json(url=first['next'])
+        self.assertEqual(len(second['results']), 10)
+        self.assertIsNone(second['next'])
+        names = [item['name'] for item in first['results'] + second['results']]
+        self.assertEqual(names, sorted(Product.objects.values_list('name', flat=True)))
+
+        back = self.get_json(url=second['previous'])
+        self.assertEqual(back['results'], first['results'])
+
+    def test_sparse_fields_select_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get_json({'fields': 'name,price', 'limit': 5})
+        self.assertEqual(data['results'][0], {'name': 'Товар 000', 'price': '10.50'})
+        page_sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('description', page_sql)
+        self.assertNotIn('category', page_sql)
+
+    def test_category_filter(self):
+        data = self.get_json({'category': 'кружки', 'fields': 'category', 'limit': 200})
+        self.assertEqual({item['category'] for item in data['results']}, {'кружки'})
+        both = self.get_json({'category': ['кружки', 'сумки'], 'limit': 200})
+        self.assertEqual(len(both['results']), API_PAGE_SIZE + 10)
+
+    def test_etag_and_errors(self):
+        response = self.client.get(reverse('api_products'))
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('api_products'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Новый', price=1)
+        self.assertEqual(self.client.get(reverse('api_products'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('api_products'), HTTP_IF_NONE_MATCH=etag)
+        self.assertFalse([q for q in queries.captured_queries if 'MAX(' in q['sql']])
+
+        response = self.client.get(reverse('api_products'), {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+        self.assertEqual(self.client.post(reverse('api_products')).status_code, 405)
+
+
+class ImportProductsTest(TestCase):
+    def write_feed(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = f'{directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as feed:
+            feed.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_products', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_upsert_by_sku(self):
+        path = self.write_feed('feed.csv', (
+            'sku,name,price,description,category\n'
+            'A-1,Кружка,500,Керамика,посуда\n'
+            'A-2,Фляжка,"1999,90",,\n'
+            ',Без артикула,10,,\n'
+            'A-3,Сумка,дорого,,\n'
+        ))
+        # Пачка: COUNT, INSERT ... ON CONFLICT, два запроса к FTS (+ SAVEPOINT/RELEASE)
+        with self.assertNumQueries(6):
+            out, err = self.run_import(path, '--batch-size', '100')
+        self.assertIn('создано 2, обновлено 0, ошибок 2', out)
+        self.assertIn('строк/с', out)
+        self.assertIn('строка 4: нет обязательных полей: sku', err)
+        flask = Product.objects.get(sku='A-2')
+        self.assertEqual(flask.price, Decimal('1999.90'))
+        self.assertEqual(flask.category, 'сувенир')
+
+        path = self.write_feed('update.csv', (
+            'sku,name,price\n'
+            'A-1,Кружка большая,650\n'
+            'A-4,Чашка,300\n'
+            f'{"X" * 65},Длинный артикул,1\n'
+        ))
+        out, err = self.run_import(path)
+        self.assertIn('создано 1, обновлено 1, ошибок 1', out)
+        self.assertIn('строка 4: артикул длиннее 64 символов', err)
+        mug = Product.objects.get(sku='A-1')
+        self.assertEqual((mug.name, mug.price), ('Кружка большая', Decimal('650.00')))
+        # Колонок description и category в фиде нет: поля не затираются
+        self.assertEqual((mug.description, mug.category), ('Керамика', 'посуда'))
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual([p.name for p in SEARCH_INDEXES['product'].search('большая', 10)], ['Кружка большая'])
+
+    def test_jsonl_batches_and_duplicates(self):
+        lines = [json.dumps({'sku': f'S{i % 25}', 'name': f'Товар {i}', 'price': i}) for i in range(60)]
+        path = self.write_feed('feed.jsonl', '\n'.join(lines + ['не json']) + '\n')
+        out, err = self.run_import(path, '--batch-size', '10')
+        self.assertIn('ошибок 1', out)
+        self.assertIn('неверный JSON', err)
+        self.assertEqual(Product.objects.count(), 25)
+        # Побеждает последняя строка с артикулом
+        self.assertEqual(Product.objects.get(sku='S0').name, 'Товар 50')
+
+        # Строки с разным набором полей в одной пачке
+        Product.objects.filter(sku='S2').update(description='Старое')
+        path = self.write_feed('mixed.jsonl', '\n'.join([
+            json.dumps({'sku': 'S1', 'name': 'Товар 1', 'price': 1, 'description': 'Новое'}),
+            json.dumps({'sku': 'S2', 'name': 'Товар 2', 'price': 2}),
+        ]) + '\n')
+        self.run_import(path)
+        self.assertEqual(Product.objects.get(sku='S1').description, 'Новое')
+        self.assertEqual(Product.objects.get(sku='S2').description, 'Старое')
+
+
+class SeedScaleTest(TestCase):
+    def test_command_creates_consistent_data(self):
+        out = io.StringIO()
+        call_command(
+            'seed_scale', '--users', '30', '--products', '50', '--articles', '5', '--comments', '200',
+            '--feedback', '40', '--seed', '3', stdout=out, stderr=io.StringIO(),
+        )
+        self.assertIn('seed=3', out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='seed3_').count(), 30)
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='seed3_').count(), 30)
+        self.assertEqual(Product.objects.filter(sku__startswith='SEED3-').count(), 50)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertEqual(FeedbackStats.get().total_count, 40)
+        self.assertEqual(Cart.objects.filter(is_active=True).count(), 9)
+        self.assertTrue(Product.objects.filter(created_at__lt=timezone.now() - timedelta(days=1)).exists())
+        for comment in Comment.objects.select_related('post')[:50]:
+            self.assertGreaterEqual(comment.created_date, comment.post.published_date)
+
+        with self.assertRaisesMessage(CommandError, 'другой --seed'):
+            call_command('seed_scale', '--scale', '0.01', '--seed', '3', stderr=io.StringIO())
+
+    def test_same_seed_gives_same_rows(self):
+        def generate():
+            with transaction.atomic():
+                ScaleSeeder(seed=11).products(20)
+                names = list(Product.objects.order_by('sku').values_list('name', 'price', 'category'))
+                transaction.set_rollback(True)
+            return names
+        self.assertEqual(generate(), generate())
+
+    def test_zipf_sampler_is_skewed(self):
+        sampler = ZipfSampler(random.Random(1), range(100))
+        counts = sorted(Counter(sampler.sample(10000)).values(), reverse=True)
+        self.assertGreater(sum(counts[:10]), 5000)
+        self.assertEqual(len(sampler.distinct(5)), 5)
+
+
+class SQLiteBackendTest(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], connection.settings_dict['OPTIONS']['pragmas']['cache_size'])
+
+    def test_file_database_uses_wal(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        settings_dict = connections.configure_settings({'default': {
+            'ENGINE': 'AvecPlaisirShop.sqlite_backend',
+            'NAME': f'{tmp_dir}/wal.sqlite3',
+            'OPTIONS': {'pragmas': {'synchronous': None}},
+        }})['default']
+        wrapper = TunedSQLiteWrapper(settings_dict, alias='wal_test')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            # None отключает PRAGMA: остается значение SQLite по умолчанию (FULL)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+@NO_PAGE_CACHE
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        # Реплика в тестах - то же соединение, что и default
+        connections['replica'] = connections['default']
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.product = Product.objects.create(name='Кружка', price=100)
+        self.user = User.objects.create_user('buyer', password='pass')
+        self.router = ReplicaRouter()
+
+    def read_aliases(self, url, method='get'):
+        """Базы, которые роутер выбрал для чтения за время запроса"""
+        aliases = []
+        original = ReplicaRouter.db_for_read
+
+        def recording(router, model, **hints):
+            alias = original(router, model, **hints)
+            aliases.append(alias)
+            return alias
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', recording):
+            getattr(self.client, method)(url)
+        return set(aliases)
+
+    def test_router(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        with replica_reads() as state:
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertIsNone(self.router.db_for_read(User))
+            self.assertIsNone(self.router.db_for_read(Task))
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertTrue(state.wrote)
+        self.assertFalse(self.router.allow_migrate('replica', 'app'))
+        self.assertIsNone(self.router.allow_migrate('default', 'app'))
+
+    def test_listed_views_read_from_replica_until_write(self):
+        self.assertIn('replica', self.read_aliases(reverse('catalog')))
+        self.client.force_login(self.user)
+        self.assertIn('replica', self.read_aliases(reverse('feedback_list')))
+        self.assertNotIn('replica', self.read_aliases(reverse('view_cart')))
+
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        self.assertTrue(self.client.session[PIN_SESSION_KEY])
+        self.assertNotIn('replica', self.read_aliases(reverse('catalog')))
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_disabled_without_replica(self):
+        self.assertEqual(self.read_aliases(reverse('catalog')), {None})
+
+
+@NO_PAGE_CACHE
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        Product.objects.create(name='Кружка', price=100)
+
+    def test_server_timing_and_log(self):
+        with self.assertLogs('app.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('catalog'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^sql;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'catalog')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['bytes'], len(response.content))
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    @override_settings(QUERY_BUDGETS={'catalog': 0})
+    def test_budget_exceeded(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'catalog'):
+            self.client.get(reverse('catalog'))
+        with override_settings(QUERY_BUDGET_STRICT=False), self.assertLogs('app.profiling', 'WARNING') as logs:
+            self.assertEqual(self.client.get(reverse('catalog')).status_code, 200)
+        self.assertIn('при бюджете 0', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS={'api_products': 0})
+    def test_streaming_response_is_checked_at_end(self):
+        # Товары читаются при отдаче тела, после выхода из представления
+        response = self.client.get(reverse('api_products'))
+        with self.assertLogs('app.profiling', 'INFO') as logs:
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'api_products'):
+                b''.join(response.streaming_content)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'api_products')
+        self.assertGreater(record['queries'], 0)
+
+
+def named_routes():
+    """Имена всех страниц: маршруты urls.py и списки объектов обеих админок"""
+    names = [
+        pattern.name for pattern in get_resolver().url_patterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    ]
+    for site in (admin.site, blog_admin_site):
+        names += [
+            f'{site.name}:{model._meta.app_label}_{model._meta.model_name}_changelist'
+            for model in site._registry
+        ]
+    return names
+
+
+@NO_PAGE_CACHE
+class QueryCountTest(TestCase):
+    """
+    Число SQL-запросов каждой страницы: не больше бюджета из QUERY_BUDGETS
+    и не растет с объемом данных (проверка на двух масштабах).
+    """
+    SCALES = (
+        {'users': 5, 'products': 8, 'articles': 4, 'comments': 25, 'feedback': 8},
+        {'users': 40, 'products': 90, 'articles': 30, 'comments': 400, 'feedback': 120},
+    )
+
+    def setUp(self):
+        self.staff = User.objects.create_superuser('manager', password='pass')
+
+    def seed(self, scale):
+        counts = self.SCALES[scale]
+        ScaleSeeder(seed=scale + 1).run(**counts)
+        # Корзина и отзывы проверяющего растут вместе с остальными данными
+        for product_id in Product.objects.order_by('-id').values_list('id', flat=True)[:counts['products'] // 4]:
+            CartItem.objects.add_for_user(self.staff, product_id)
+        anonymous = Feedback.objects.filter(user__isnull=True).values('pk')[:counts['feedback'] // 4]
+        Feedback.objects.filter(pk__in=anonymous).update(user=self.staff)
+        # Каждый масштаб начинается с холодных кэшей и новой сессии
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.client.force_login(self.staff)
+
+    def routes(self):
+        """Имя страницы -> (метод, аргументы URL, параметры); разрушающие - в конце"""
+        article_id = Comment.objects.values('post').annotate(n=Count('id')).order_by('-n', 'post')[0]['post']
+        comment_id = Comment.objects.filter(post_id=article_id).order_by('id')[0].id
+        product = Product.objects.order_by('id')[0]
+        item_ids = list(
+            CartItem.objects.filter(cart__user=self.staff, cart__is_active=True)
+            .order_by('id').values_list('id', flat=True)
+        )
+        word = product.name.split()[0]
+
+        def get(*args, **query):
+            return 'get', args, query
+
+        routes = {
+            'home': get(), 'about': get(), 'contact': get(), 'video_page': get(),
+            'register': get(), 'login': get(),
+            'feedback': get(), 'feedback_list': get(), 'my_feedbacks': get(), 'export_feedback': get(),
+            'delete_feedback': get(Feedback.objects.order_by('id')[0].id),
+            'blog_list': get(), 'blog_article_detail': get(article_id), 'blog_article_comments': get(article_id),
+            'create_article': get(), 'edit_article': get(article_id), 'delete_article': get(article_id),
+            'delete_comment': get(comment_id),
+            'search': get(q=word), 'catalog': get(), 'catalog_autocomplete': get(q=word[:3]),
+            'api_products': get(),
+            'create_product': get(), 'edit_product': get(product.id), 'delete_product': get(product.id),
+            'view_cart': get(),
+            'add_to_cart': ('post', (product.id,), {}),
+            'update_cart_item': ('post', (item_ids[0],), {'quantity': 3}),
+            'remove_from_cart': get(item_ids[-1]),
+            'clear_cart': get(),
+        }
+        for name in named_routes():
+            if name.endswith('_changelist'):
+                routes[name] = get()
+        routes['logout'] = get()
+        return routes
+
+    def fetch(self, name, method, args, data):
+        response = getattr(self.client, method)(reverse(name, args=args), data)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, name)
+
+    def test_every_route_has_budget(self):
+        self.assertEqual([name for name in named_routes() if name not in settings.QUERY_BUDGETS], [])
+
+    def test_query_counts_do_not_grow_with_data(self):
+        baseline = {}
+        for scale in range(len(self.SCALES)):
+            self.seed(scale)
+            routes = self.routes()
+            self.assertEqual(set(routes), set(named_routes()))
+            for name, (method, args, data) in routes.items():
+                with self.subTest(route=name, scale=scale):
+                    if scale == 0:
+                        with CaptureQueriesContext(connection) as queries:
+                            self.fetch(name, method, args, data)
+                        baseline[name] = len(queries)
+                        self.assertLessEqual(len(queries), settings.QUERY_BUDGETS[name])
+                    else:
+                        with self.assertNumQueries(baseline[name]):
+                            self.fetch(name, method, args, data)
+
+
+class BenchShopTest(TestCase):
+    def test_summary(self):
+        samples = [('catalog', i / 1000, False) for i in range(1, 101)] + [('view_cart', 0.5, True)]
+        result = summarize(samples, duration=2)
+        self.assertEqual(result['requests'], 101)
+        self.assertEqual(result['errors'], 1)
+        self.assertEqual(result['rps'], 50.5)
+        catalog = result['scenarios']['catalog']
+        self.assertEqual(catalog['latency_ms']['p50'], 51.0)
+        self.assertEqual(catalog['latency_ms']['p99'], 100.0)
+        self.assertEqual(result['scenarios']['view_cart']['errors'], 1)
+        json.dumps(result)
+
+    def test_mix(self):
+        self.assertEqual(parse_mix('catalog=3, view_cart=1'), {'catalog': 3.0, 'view_cart': 1.0})
+        for value in ('unknown=1', 'catalog=x', 'catalog=0'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_mix(value)
+
+    def test_sample_rows(self):
+        ids = {Product.objects.create(name=f'Товар {i}', price=1).id for i in range(40)}
+        rows = sample_rows(Product.objects.all(), ('name',), 5, random.Random(1))
+        self.assertEqual(len({product_id for product_id, _ in rows}), 5)
+        self.assertLessEqual({product_id for product_id, _ in rows}, ids)
+        self.assertEqual(sample_rows(Comment.objects.all(), (), 5, random.Random(1)), [])
+
+    def test_cleanup_removes_bench_rows(self):
+        usernames, created = ensure_bench_users(2)
+        self.assertEqual(usernames, created)
+        user = User.objects.get(username=usernames[0])
+        article = BlogArticle.objects.create(title='Статья', short_content='Кратко', full_content='Текст')
+        Comment.objects.create(post=article, author=user, text='Комментарий нагрузочного теста')
+        CartItem.objects.add_for_user(user, Product.objects.create(name='Кружка', price=1).id)
+        self.client.force_login(user)
+        session_key = self.client.session.session_key
+
+        cleanup_bench_data(created, [session_key])
+        self.assertFalse(User.objects.filter(username__in=usernames).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(self.client.session.exists(session_key))
+
+    def test_existing_users_are_kept(self):
+        # Чужой bench_0 с другим паролем пропускается, оставшийся bench_1 переиспользуется
+        User.objects.create_user('bench_0', password='secret')
+        User.objects.create_user('bench_1', password=BENCH_PASSWORD)
+        usernames, created = ensure_bench_users(2)
+        self.assertEqual(usernames, ['bench_1', 'bench_2'])
+        self.assertEqual(created, ['bench_2'])
+        self.assertTrue(self.client.login(username='bench_1', password=BENCH_PASSWORD))
+
+        cleanup_bench_data(created, [])
+        self.assertEqual(set(User.objects.values_list('username', flat=True)), {'bench_0', 'bench_1'})
@@ -1,17 +1,32 @@
 ﻿# views.py
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import login, logout
 from django.contrib import messages
-from django.db.models import Avg
+from django.db.models import Count, Max, Q
 from django.utils import timezone
+from django.views.decorators.http import condition
 
 # === ИМПОРТ ФОРМ (ОДИН РАЗ!) ===
 from .forms import FeedbackForm, CommentForm, BlogArticleForm, ProductForm 
 
 # === ИМПОРТ МОДЕЛЕЙ (ОДИН РАЗ!) ===
-from .models import Feedback, BlogArticle, Comment, Product, Cart, CartItem 
+from .models import Feedback, FeedbackStats, BlogArticle, Comment, Product, Cart, CartItem 
+from .pagination import keyset_paginate
+from .exports import EXPORT_FORMATS, feedback_export_queryset, iter_feedback_export
+from .autocomplete import product_index
+from .search import SEARCH_INDEXES
+from .conditional import page_etag, safe_methods_only
+from .caching import get_generations, prefetch_fragments, product_categories
+from .context_processors import (
+    get_cart_items_count as cached_cart_items_count,
+    invalidate_cart_items_count,
+    set_cart_items_count,
+)
 
 def home(request):
     return render(request, 'app/index.html')
@@ -56,17 +71,18 @@ def feedback(request):
     if request.method == 'POST':
         form = FeedbackForm(request.POST)
         if form.is_valid():
-            liked_features = ', '.join(form.cleaned_data['liked_features'])
-            feedback_obj = Feedback.objects.create(
+            feedback_obj = Feedback(
+                user=request.user,
                 name=form.cleaned_data['name'],
                 email=request.user.email,
                 overall_rating=form.cleaned_data['overall_rating'],
-                liked_features=liked_features,
                 visit_frequency=form.cleaned_data['visit_frequency'],
                 recommendation=form.cleaned_data['recommendation'],
                 suggestions=form.cleaned_data['suggestions'] or '',
                 agree_to_terms=form.cleaned_data['agree_to_terms']
             )
+            # Сохраняет отзыв и отмеченные пункты в FeedbackFeature
+            feedback_obj.set_liked_features(form.cleaned_data['liked_features'])
             messages.success(request, 'Спасибо за ваш отзыв!')
             return render(request, 'app/feedback_thanks.html', {'feedback': feedback_obj})
     else:
@@ -76,29 +92,36 @@ def feedback(request):
         })
     return render(request, 'app/feedback.html', {'form': form})
 
+FEEDBACK_PAGE_SIZE = 20
+
+
 def feedback_list(request):
-    feedbacks = Feedback.objects.all().order_by('-created_at')
-    total_feedbacks = feedbacks.count()
-    if total_feedbacks > 0:
-        avg_result = feedbacks.aggregate(Avg('recommendation'))
-        avg_recommendation = round(avg_result['recommendation__avg'], 1)
-    else:
-        avg_recommendation = 0
+    # Итоги берутся из заранее посчитанной строки FeedbackStats,
+    # а сам список читается постранично
+    stats = FeedbackStats.get()
+    page = keyset_paginate(
+        Feedback.objects.all(),
+        ('-created_at', '-id'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=FEEDBACK_PAGE_SIZE,
+    )
     return render(request, 'app/feedback_list.html', {
-        'feedbacks': feedbacks,
-        'total_feedbacks': total_feedbacks,
-        'avg_recommendation': avg_recommendation,
+        'feedbacks': page,
+        'page': page,
+        'stats': stats,
+        'total_feedbacks': stats.total_count,
+        'avg_recommendation': stats.average_recommendation,
         'is_admin': request.user.is_staff or request.user.is_superuser,
     })
 
 @login_required
 def my_feedbacks(request):
-    user_feedbacks = Feedback.objects.filter(
-        email=request.user.email
-    ).order_by('-created_at')
+    # Один проход по индексу (user_id, created_at); количество - длина списка
+    user_feedbacks = list(request.user.feedbacks.order_by('-created_at'))
     return render(request, 'app/my_feedbacks.html', {
         'feedbacks': user_feedbacks,
-        'total_feedbacks': user_feedbacks.count()
+        'total_feedbacks': len(user_feedbacks)
     })
 
 @login_required
@@ -115,16 +138,84 @@ def delete_feedback(request, feedback_id):
         'feedback': feedback
     })
 
+@login_required
+def export_feedback(request):
+    """Потоковая выгрузка отзывов (CSV/NDJSON) для аналитики, только для администраторов"""
+    if not (request.user.is_staff or request.user.is_superuser):
+        messages.error(request, 'У вас нет прав для выгрузки отзывов.')
+        return redirect('feedback_list')
+    export_format = request.GET.get('format', 'csv')
+    try:
+        queryset = feedback_export_queryset(request.GET.get('date_from'), request.GET.get('date_to'))
+        chunks = iter_feedback_export(queryset, export_format)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[export_format])
+    filename = f"feedback_{timezone.now():%Y%m%d_%H%M}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+BLOG_PAGE_SIZE = 10
+
+
+@safe_methods_only
+def _blog_list_etag(request):
+    # Поколения тем из app/caching.py меняются при любом изменении статей и
+    # комментариев (включая удаление и массовые действия админки) и читаются
+    # из кэша без SQL, в отличие от COUNT по всем комментариям
+    return page_etag(request, get_generations(('articles', 'comments')))
+
+
+@condition(etag_func=_blog_list_etag)
 def blog_list(request):
-    articles = BlogArticle.objects.all().order_by('-published_date')
+    articles = BlogArticle.objects.defer('full_content').annotate(
+        comments_count=Count('comments', filter=Q(comments__approved_comment=True))
+    )
+    page = keyset_paginate(
+        articles,
+        ('-published_date', '-id'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=BLOG_PAGE_SIZE,
+    )
     return render(request, 'app/blog_list.html', {
-        'articles': articles,
+        'articles': page,
+        'page': page,
         'show_create_button': request.user.is_staff or request.user.is_superuser
     })
 
+COMMENTS_PAGE_SIZE = 20
+
+
+def _approved_comments(article_id):
+    """Одобренные комментарии статьи вместе с авторами (один JOIN вместо запроса на каждого)"""
+    return Comment.objects.filter(post_id=article_id, approved_comment=True).select_related('author')
+
+
+def _comments_page(article_id, after=None):
+    return keyset_paginate(
+        _approved_comments(article_id),
+        ('-created_date', '-id'),
+        after=after,
+        per_page=COMMENTS_PAGE_SIZE,
+    )
+
+
+@safe_methods_only
+def _article_etag(request, article_id):
+    article = BlogArticle.objects.filter(id=article_id).values_list('updated_at', flat=True).first()
+    if article is None:
+        return None
+    comments = _approved_comments(article_id).aggregate(
+        latest=Max('created_date'), last_id=Max('id'), count=Count('id')
+    )
+    return page_etag(request, article, comments)
+
+
+@condition(etag_func=_article_etag)
 def blog_article_detail(request, article_id):
     article = get_object_or_404(BlogArticle, id=article_id)
-    comments = article.comments.filter(approved_comment=True).order_by('-created_date')
+    comments = _comments_page(article.id, after=request.GET.get('comments_after'))
     if request.method == 'POST' and request.user.is_authenticated:
         text = request.POST.get('text', '').strip()
         if text and len(text) >= 3:
@@ -141,45 +232,84 @@ def blog_article_detail(request, article_id):
     return render(request, 'app/blog_article_detail.html', {
         'article': article,
         'comments': comments,
+        'comments_count': _approved_comments(article.id).count(),
         'user_can_comment': request.user.is_authenticated,
         'show_edit_button': request.user.is_staff or request.user.is_superuser
     })
 
 # ========== КАТАЛОГ ТОВАРОВ ==========
+CATALOG_PAGE_SIZE = 24
+
+
+@safe_methods_only
+def _catalog_etag(request):
+    # Список категорий зависит от всей таблицы, поэтому валидатор общий для всех
+    # фильтров: поколение темы products (без агрегата по всей таблице)
+    return page_etag(request, get_generations(('products',)))
+
+
+@condition(etag_func=_catalog_etag)
 def catalog(request):
-    """Каталог товаров"""
-    products = Product.objects.all().order_by('name')
+    """Каталог товаров с keyset-пагинацией по (name, id) и фильтром по категории"""
+    category = request.GET.get('category', '').strip()
+    products = Product.objects.all()
+    if category:
+        products = products.filter(category=category)
+    page = keyset_paginate(
+        products,
+        ('name', 'id'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=CATALOG_PAGE_SIZE,
+    )
+    # Готовые карточки товаров читаются из кэша фрагментов одним запросом
+    prefetch_fragments(page.object_list, 'card')
     return render(request, 'app/catalog.html', {
-        'products': products,
+        'products': page,
+        'page': page,
+        'categories': product_categories(),
+        'current_category': category,
         'title': 'Каталог товаров'
     })
 
 
+AUTOCOMPLETE_DEFAULT_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+
+def catalog_autocomplete(request):
+    """Подсказки по названиям товаров для поля поиска (без запросов к БД)"""
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT))
+    except ValueError:
+        limit = AUTOCOMPLETE_DEFAULT_LIMIT
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {'id': product_id, 'name': name, 'price': price, 'category': category}
+            for product_id, name, price, category in product_index.lookup(query, limit)
+        ],
+    })
+
+
 @login_required
 def add_to_cart(request, product_id):
     """Добавить товар в корзину"""
-    product = get_object_or_404(Product, id=product_id)
-    
-    # Получаем или создаем корзину пользователя
-    cart, created = Cart.objects.get_or_create(
-        user=request.user,
-        is_active=True
-    )
-    
-    # Проверяем, есть ли уже этот товар в корзине
-    cart_item, item_created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
+    # Обычный случай - товар уже в корзине: один UPDATE ... RETURNING с названием товара
+    product_name = CartItem.objects.increment_for_user(request.user, product_id)
+    item_created = False
+    if product_name is None:
+        product = get_object_or_404(Product.objects.only('id', 'name'), id=product_id)
+        product_name = product.name
+        item_created = CartItem.objects.create_for_user(request.user, product.id)
+    invalidate_cart_items_count(request.user)
     
     if not item_created:
-        # Если товар уже в корзине, увеличиваем количество
-        cart_item.quantity += 1
-        cart_item.save()
-        messages.success(request, f'Количество товара "{product.name}" увеличено в корзине')
+        messages.success(request, f'Количество товара "{product_name}" увеличено в корзине')
     else:
-        messages.success(request, f'Товар "{product.name}" добавлен в корзину')
+        messages.success(request, f'Товар "{product_name}" добавлен в корзину')
     
     return redirect('catalog')
 
@@ -190,6 +320,7 @@ def remove_from_cart(request, item_id):
     cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     product_name = cart_item.product.name
     cart_item.delete()
+    invalidate_cart_items_count(request.user)
     messages.success(request, f'Товар "{product_name}" удален из корзины')
     return redirect('view_cart')
 
@@ -207,6 +338,7 @@ def update_cart_item(request, item_id):
             messages.success(request, f'Количество товара "{cart_item.product.name}" обновлено')
         else:
             cart_item.delete()
+            invalidate_cart_items_count(request.user)
             messages.success(request, f'Товар "{cart_item.product.name}" удален из корзины')
     
     return redirect('view_cart')
@@ -221,12 +353,16 @@ def view_cart(request):
         is_active=True
     )
     
-    cart_items = cart.items.all().select_related('product')
+    cart_items = cart.items.with_line_totals().select_related('product').order_by('added_at', 'id')
+    totals = cart.totals()
+    set_cart_items_count(request.user, totals['items_count'])
     
     return render(request, 'app/cart.html', {
         'cart': cart,
         'cart_items': cart_items,
-        'total_price': cart.total_price(),
+        'total_price': totals['total_price'],
+        'items_count': totals['items_count'],
+        'total_quantity': totals['total_quantity'],
         'title': 'Моя корзина'
     })
 
@@ -237,6 +373,7 @@ def clear_cart(request):
     cart = get_object_or_404(Cart, user=request.user, is_active=True)
     count = cart.items.count()
     cart.items.all().delete()
+    invalidate_cart_items_count(request.user)
     messages.success(request, f'Корзина очищена ({count} товаров удалено)')
     return redirect('view_cart')
 
@@ -312,14 +449,30 @@ def delete_product(request, product_id):
 # Функция для проверки количества товаров в корзине (для шаблона)
 def get_cart_items_count(request):
     """Получить количество товаров в корзине"""
-    if request.user.is_authenticated:
-        try:
-            cart = Cart.objects.get(user=request.user, is_active=True)
-            return cart.items.count()
-        except Cart.DoesNotExist:
-            return 0
-    return 0
-
+    return cached_cart_items_count(request.user)
+
+
+def blog_article_comments(request, article_id):
+    """Следующая страница комментариев в JSON для кнопки «Загрузить еще»"""
+    article = get_object_or_404(BlogArticle.objects.only('id'), id=article_id)
+    comments = _comments_page(article.id, after=request.GET.get('after'))
+    next_url = None
+    if comments.has_next:
+        next_url = f"{reverse('blog_article_comments', args=[article.id])}?after={comments.next_cursor}"
+    return JsonResponse({
+        'html': render_to_string('app/comments_page.html', {'comments': comments}, request=request),
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.author.username,
+                'author_is_staff': comment.author.is_staff,
+                'text': comment.text,
+                'created_date': comment.created_date,
+            }
+            for comment in comments
+        ],
+        'next': next_url,
+    })
 
 @login_required
 def create_article(request):
@@ -393,5 +546,23 @@ def delete_comment(request, comment_id):
         'comment': comment
     })
 
+# ========== ПОИСК ==========
+SEARCH_RESULTS_LIMIT = 20
+
+
+def search(request):
+    """Полнотекстовый поиск по товарам и статьям блога"""
+    query = request.GET.get('q', '').strip()
+    products = articles = []
+    if query:
+        products = SEARCH_INDEXES['product'].search(query, limit=SEARCH_RESULTS_LIMIT)
+        articles = SEARCH_INDEXES['article'].search(query, limit=SEARCH_RESULTS_LIMIT)
+    return render(request, 'app/search.html', {
+        'query': query,
+        'products': products,
+        'articles': articles,
+        'title': 'Поиск'
+    })
+
 def video_page(request):
     return render(request, 'app/video.html')
\ No newline at end of file